@@ -0,0 +1,92 @@
+"""
+Compare the streaming TextChunker with the previous string-concatenating implementation.
+
+Usage: python benchmarks/bench_chunker.py [filing.txt ...] [--size-mb 5]
+Without paths a synthetic filing of --size-mb is generated.
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from rag.chunker import Document, TextChunker
+
+
+def legacy_chunk_text(chunker: TextChunker, text: str, company: str, year: str, source: str) -> List[Document]:
+    sentences = re.split(r'(?<=[.!?])\s+', text)
+    chunks: List[Document] = []
+    current_chunk = ""
+    current_size = 0
+    chunk_id = 0
+    for sentence in sentences:
+        sentence_size = len(sentence.split())
+        if current_size + sentence_size > chunker.chunk_size and current_chunk:
+            chunks.append(Document(current_chunk.strip(), company, year, source, f"{company}_{year}_{chunk_id}"))
+            words = current_chunk.split()
+            overlap_text = ' '.join(words[-chunker.overlap:]) if len(words) > chunker.overlap else current_chunk
+            current_chunk = overlap_text + " " + sentence
+            current_size = len(current_chunk.split())
+            chunk_id += 1
+        else:
+            current_chunk += " " + sentence
+            current_size += sentence_size
+    if current_chunk.strip():
+        chunks.append(Document(current_chunk.strip(), company, year, source, f"{company}_{year}_{chunk_id}"))
+    return chunks
+
+
+def make_synthetic_text(size_mb: float) -> str:
+    rng = random.Random(0)
+    words = ["revenue", "increased", "operating", "income", "cloud", "segment", "fiscal", "billion",
+             "margin", "growth", "compared", "primarily", "driven", "by", "the", "of", "and", "in"]
+    sentences = []
+    total = 0
+    while total < size_mb * 1024 * 1024:
+        sentence = " ".join(rng.choice(words) for _ in range(rng.randint(5, 40))).capitalize() + "."
+        sentences.append(sentence)
+        total += len(sentence) + 1
+    return "\n".join(sentences)
+
+
+def measure(label: str, fn, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    chunks = fn(*args)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<12} {elapsed:8.3f} s   peak {peak / 1e6:8.1f} MB   {len(chunks)} chunks")
+    return chunks, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="*")
+    parser.add_argument("--size-mb", type=float, default=5)
+    args = parser.parse_args()
+
+    texts = []
+    for path in args.paths:
+        with open(path, "r", encoding="utf-8") as f:
+            texts.append((path, f.read()))
+    if not texts:
+        texts.append(("synthetic", make_synthetic_text(args.size_mb)))
+
+    chunker = TextChunker()
+    for name, text in texts:
+        print(f"\n{name} ({len(text) / 1e6:.1f} MB)")
+        legacy, legacy_time = measure("previous", legacy_chunk_text, chunker, text, "C", "2023", "C_2023_10K")
+        streaming, streaming_time = measure("streaming", chunker.chunk_text, text, "C", "2023", "C_2023_10K")
+        same = [" ".join(d.content.split()) for d in legacy] == [" ".join(d.content.split()) for d in streaming]
+        print(f"speed-up {legacy_time / max(streaming_time, 1e-9):.1f}x, same boundaries: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Compare the streaming HTML extractor with the previous BeautifulSoup path.
+
+Usage: python benchmarks/bench_extract.py [filing.html ...] [--size-mb 20] [--copies 8]
+Without filing paths a synthetic inline-XBRL 10-K of --size-mb is generated.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from rag.html_extract import extract_many, extract_text
+from rag.sec_data import SECDataAcquisition
+
+
+def make_synthetic_filing(path: str, size_mb: float):
+    paragraph = ("<p>Revenue increased <ix:nonFraction name=\"us-gaap:Revenues\">245.1</ix:nonFraction> billion "
+                 "driven by Intelligent Cloud growth. Operating margin was 44.6%.</p>\n")
+    table = ("<table><tr><td>Revenue</td><td>$ 245,122</td><td>$ 211,915</td></tr>"
+             "<tr><td>Research and development</td><td>29,510</td><td>27,195</td></tr></table>\n")
+    header = ("<div style=\"display:none\"><ix:header><ix:hidden>" + "<ix:nonNumeric>dei</ix:nonNumeric>" * 2000 +
+              "</ix:hidden></ix:header></div>\n")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("<html><head><title>10-K</title><style>p{margin:0}</style></head><body>\n" + header)
+        written = 0
+        section = 1
+        while written < size_mb * 1024 * 1024:
+            block = f"<h2>Item {section}. Section</h2>\n" + paragraph * 40 + table * 5 + "<script>var x=1;</script>\n"
+            f.write(block)
+            written += len(block)
+            section += 1
+        f.write("</body></html>")
+
+
+def measure(label: str, fn, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed:8.2f} s   peak {peak / 1e6:8.1f} MB")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="*")
+    parser.add_argument("--size-mb", type=float, default=20)
+    parser.add_argument("--copies", type=int, default=8)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_extract_")
+    try:
+        paths = args.paths
+        if not paths:
+            path = os.path.join(workdir, "synthetic_10k.htm")
+            make_synthetic_filing(path, args.size_mb)
+            paths = [path]
+
+        acquisition = SECDataAcquisition(data_dir=workdir)
+        for path in paths:
+            print(f"\n{path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+            legacy = measure("BeautifulSoup (previous)", acquisition.extract_text_from_html_bs4, path)
+            streaming = measure("streaming extractor", extract_text, path)
+            print(f"words: previous {len(legacy.split())}, streaming {len(streaming.split())}")
+
+        copies = []
+        for i in range(args.copies):
+            copy = os.path.join(workdir, f"copy_{i}.htm")
+            shutil.copyfile(paths[0], copy)
+            copies.append(copy)
+        print(f"\n{args.copies} filings")
+        started = time.perf_counter()
+        extract_many(copies, processes=1)
+        print(f"{'serial':<28} {time.perf_counter() - started:8.2f} s")
+        started = time.perf_counter()
+        extract_many(copies)
+        print(f"{f'{os.cpu_count()} processes':<28} {time.perf_counter() - started:8.2f} s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Cold-start cost of the rag package: import time and time to the first search.
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--onnx-dir DIR]
+Each measurement runs in a fresh interpreter. A small snapshot is built first; the
+time-to-first-query runs load it and search once (no LLM call), with the SentenceTransformer
+query encoder and, when --onnx-dir points at an export_onnx directory, with ONNX Runtime.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+IMPORT_CODE = """
+import time
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+"""
+
+FIRST_QUERY_CODE = """
+import time
+started = time.perf_counter()
+from rag.vectorstore import VectorStore
+query_encoder = None
+if {onnx_dir!r}:
+    from rag.onnx_encoder import OnnxQueryEncoder
+    query_encoder = OnnxQueryEncoder({onnx_dir!r})
+store = VectorStore(query_encoder=query_encoder)
+assert store.load({snapshot_dir!r}, {{}})
+loaded = time.perf_counter()
+store.search("Microsoft total revenue 2023", k=3)
+print(loaded - started, time.perf_counter() - started)
+"""
+
+BUILD_CODE = """
+from rag.chunker import Document
+from rag.vectorstore import VectorStore
+store = VectorStore()
+store.add_documents([Document(f"Filing excerpt {{i}} about revenue, margins and R&D spending.", "MSFT", "2023",
+                              "MSFT_2023_10K", f"MSFT_2023_{{i}}") for i in range(2000)])
+store.save({snapshot_dir!r}, {{}})
+"""
+
+
+def run(code: str) -> list:
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return [float(value) for value in output.stdout.strip().splitlines()[-1].split()]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--onnx-dir")
+    args = parser.parse_args()
+
+    results = {}
+    for module in ("rag", "rag.system"):
+        samples = [run(IMPORT_CODE.format(module=module))[0] for _ in range(args.runs)]
+        results[f"import {module}"] = statistics.median(samples)
+
+    snapshot_dir = tempfile.mkdtemp(prefix="bench_startup_")
+    try:
+        run(BUILD_CODE.format(snapshot_dir=snapshot_dir) + "\nprint(0)")
+        encoders = [("sentence-transformers", "")] + ([("onnx", args.onnx_dir)] if args.onnx_dir else [])
+        for label, onnx_dir in encoders:
+            samples = [run(FIRST_QUERY_CODE.format(snapshot_dir=snapshot_dir, onnx_dir=onnx_dir))
+                       for _ in range(args.runs)]
+            results[f"snapshot load ({label})"] = statistics.median(sample[0] for sample in samples)
+            results[f"first query ({label})"] = statistics.median(sample[1] for sample in samples)
+    finally:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+    for name, seconds in results.items():
+        print(f"{name:<40} {seconds * 1000:8.1f} ms")
+    print(json.dumps({name: round(seconds, 4) for name, seconds in results.items()}))
+
+
+if __name__ == "__main__":
+    main()
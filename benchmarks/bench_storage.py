@@ -0,0 +1,51 @@
+"""
+Index memory and recall@k for each vector storage option, with and without exact re-scoring.
+
+Usage: python benchmarks/bench_storage.py [--vectors 100000] [--dim 384] [--index-type flat]
+Vectors are random unit vectors drawn around a few hundred cluster centres, which is closer to
+sentence embeddings than uniform noise.
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import faiss
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from rag.index_backends import STORAGE_TYPES, IndexConfig, build_index, format_recall_report, recall_report, train_index
+
+
+def make_vectors(count: int, dimension: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((max(1, count // 200), dimension)).astype(np.float32)
+    vectors = centres[rng.integers(0, len(centres), count)] + 0.5 * rng.standard_normal((count, dimension)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--index-type", default="flat")
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.vectors, args.dim)
+    ids = np.arange(len(vectors), dtype=np.int64)
+    print(f"{args.vectors} x {args.dim} float32 vectors: {vectors.nbytes / 1e6:.1f} MB\n")
+    for storage in STORAGE_TYPES:
+        config = IndexConfig(index_type=args.index_type, storage=storage, min_corpus_size=0, pq_m=48)
+        index = build_index(config, args.index_type, args.dim, len(vectors), storage)
+        train_index(index, config, vectors)
+        index.add_with_ids(vectors, ids)
+        size = len(faiss.serialize_index(index))
+        print(f"{storage}: index {size / 1e6:.1f} MB")
+        print(format_recall_report(recall_report(index, config, args.index_type, vectors, ids, storage=storage)))
+        print()
+
+
+if __name__ == "__main__":
+    main()
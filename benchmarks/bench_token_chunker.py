@@ -0,0 +1,56 @@
+"""
+Compare word-count and tokenizer-exact chunking: encoder truncation and embedding time.
+
+Usage: python benchmarks/bench_token_chunker.py [filing.txt ...] [--size-mb 1] [--model all-MiniLM-L6-v2]
+Without paths a synthetic filing of --size-mb is generated.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sentence_transformers import SentenceTransformer
+
+from bench_chunker import make_synthetic_text
+from rag.chunker import TextChunker, TokenChunker, truncation_report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="*")
+    parser.add_argument("--size-mb", type=float, default=1)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    args = parser.parse_args()
+
+    texts = []
+    for path in args.paths:
+        with open(path, "r", encoding="utf-8") as f:
+            texts.append(f.read())
+    if not texts:
+        texts.append(make_synthetic_text(args.size_mb))
+
+    encoder = SentenceTransformer(args.model)
+    max_tokens = encoder.max_seq_length - encoder.tokenizer.num_special_tokens_to_add()
+    chunkers = {
+        "words (800/100)": TextChunker(),
+        f"tokens ({max_tokens}/32)": TokenChunker(encoder.tokenizer, max_tokens=max_tokens),
+    }
+    for label, chunker in chunkers.items():
+        started = time.perf_counter()
+        documents = [doc for text in texts for doc in chunker.chunk_text(text, "C", "2023", "C_2023_10K")]
+        chunk_time = time.perf_counter() - started
+        contents = [doc.content for doc in documents]
+        report = truncation_report(contents, encoder.tokenizer, max_tokens)
+        started = time.perf_counter()
+        encoder.encode(contents, batch_size=64)
+        encode_time = time.perf_counter() - started
+        print(f"{label:<20} {len(documents):6d} chunks  chunking {chunk_time:6.2f} s  encoding {encode_time:7.2f} s  "
+              f"truncated {report['truncated_chunks']}/{report['chunks']}  "
+              f"tokens dropped {report['dropped_fraction']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Fixture questions for the XBRL facts path's question parser.
+
+Usage: python benchmarks/check_facts_questions.py
+Each question either resolves to an expected (kind, metric) or must fall back to the text path
+(None), because the facts path answers without an LLM and a wrong match gives a confident wrong
+number. Exits non-zero on any mismatch.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from rag.lexicon import COMPANIES
+from rag.xbrl import parse_question
+
+QUESTIONS = [
+    ("What was NVIDIA's total revenue in fiscal year 2024?", ("lookup", "revenue")),
+    ("Which of the three companies had the highest gross margin in 2023?", ("rank", "gross_margin")),
+    ("Compare the R&D spending as a percentage of revenue across all three companies in 2023",
+     ("compare", "rd_expense_over_revenue")),
+    ("How did NVIDIA revenue change in 2024?", ("growth", "revenue")),
+    ("Compare Microsoft vs Google net income in 2023", ("compare", "net_income")),
+    ("What were Alphabet's total assets in 2023?", ("lookup", "total_assets")),
+    ("How much cash did Microsoft hold at the end of fiscal 2024?", ("lookup", "cash")),
+    # Segments and qualitative questions
+    ("What percentage of Google's 2023 revenue came from advertising?", None),
+    ("How much did Microsoft's cloud revenue grow from 2022 to 2023?", None),
+    ("Explain NVIDIA's AI strategy in 2024", None),
+    # Qualified line items that contain a metric alias
+    ("What were Microsoft's sales and marketing expenses in 2023?", None),
+    ("How much deferred revenue did Microsoft report in 2023?", None),
+    ("What was Alphabet's unearned revenue in 2023?", None),
+    ("What were NVIDIA's current assets in fiscal 2024?", None),
+    ("How large were Alphabet's intangible assets in 2023?", None),
+    ("How much cash did Microsoft pay in dividends in 2023?", None),
+    ("What was Microsoft's cash dividends total in 2024?", None),
+    ("What was Microsoft's revenue in 2023 excluding acquisitions?", None),
+    ("Which company had the highest adjusted net income in 2023?", None),
+    # Metric aliases that hold a share or rank term of their own
+    ("What was NVIDIA's R&D as a percentage of revenue in 2024?", ("lookup", "rd_intensity")),
+    ("What was Microsoft's top line in 2023?", ("lookup", "revenue")),
+    # Words the lexicon does not cover qualify the metric
+    ("What was Microsoft's revenue in Europe in 2023?", None),
+    ("What was Microsoft's revenue per share in 2023?", None),
+    ("How much operating cash did Microsoft have in 2023?", None),
+    ("Compare capital expenditures versus revenue for Microsoft in 2023", None),
+]
+
+
+def main():
+    failures = 0
+    for question, expected in QUESTIONS:
+        parsed = parse_question(question, list(COMPANIES))
+        got = (parsed.kind, parsed.metric.name) if parsed is not None else None
+        ok = got == expected
+        failures += not ok
+        print(f"{'ok    ' if ok else 'FAILED'} {question} -> {got}" + ("" if ok else f" (expected {expected})"))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Removal round-trip check for every index type and vector storage.
+
+Usage: python benchmarks/check_index_removal.py [--vectors 3000] [--dim 32]
+Builds each backend, removes a few ids, and checks that every remaining vector still finds
+itself under its own id, both on the raw index and through VectorStore.remove_documents.
+Candidates are re-scored with the full vectors, as VectorStore does, so lossy PQ codes do not
+count as failures; a mislabelled id re-scores against the wrong vector and does.
+Exits non-zero if any backend reports a removed id or mislabels a surviving one.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+
+import numpy as np
+import faiss
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from rag.chunker import Document
+from rag.index_backends import (
+    INDEX_TYPES, STORAGE_TYPES, IndexConfig, build_index, rescore, search_parameters, supports_removal, train_index,
+)
+from rag.vectorstore import VectorStore
+
+# Nearest neighbours re-scored per probe
+CANDIDATES = 16
+
+
+def make_vectors(count: int, dimension: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def finds_itself(index: "faiss.Index", params, vectors: np.ndarray, probes: np.ndarray) -> bool:
+    _, candidates = index.search(vectors[probes], CANDIDATES, params=params)
+    _, found = rescore(vectors[probes], candidates, vectors, 1)
+    return bool(np.array_equal(found[:, 0], probes))
+
+
+def check_index(config: IndexConfig, index_type: str, storage: str, vectors: np.ndarray, removed: np.ndarray,
+                probes: np.ndarray) -> bool:
+    index = build_index(config, index_type, vectors.shape[1], len(vectors), storage)
+    train_index(index, config, vectors)
+    index.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+    index.remove_ids(removed)
+    return finds_itself(index, search_parameters(config, index_type, storage=storage), vectors, probes)
+
+
+def check_store(config: IndexConfig, vectors: np.ndarray, removed: np.ndarray, probes: np.ndarray) -> bool:
+    store = VectorStore(index_config=config)
+    documents = [Document(f"chunk {i}", "MSFT", "2023", "check", f"c{i}") for i in range(len(vectors))]
+    # Rebuilds print recall reports, which are not what this script checks.
+    with contextlib.redirect_stdout(io.StringIO()):
+        store.add_documents(documents, embeddings=vectors, verbose=False)
+        store.remove_documents([f"c{i}" for i in removed])
+    params = search_parameters(config, store.index_type, storage=store.index_storage)
+    return len(store) == len(vectors) - len(removed) and finds_itself(store.index, params, vectors, probes)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=3000)
+    parser.add_argument("--dim", type=int, default=32)
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.vectors, args.dim)
+    removed = np.array([10, 11, args.vectors // 2], dtype=np.int64)
+    probes = np.setdiff1d(np.arange(0, args.vectors, max(1, args.vectors // 50)), removed)
+    failures = 0
+    for index_type in INDEX_TYPES:
+        for storage in STORAGE_TYPES:
+            if index_type == "ivf_pq" and storage != "float32":
+                continue
+            # Every list is probed, so a miss can only come from a mislabelled id.
+            config = IndexConfig(index_type=index_type, storage=storage, min_corpus_size=0, nlist=8, nprobe=8,
+                                 pq_m=8, pq_nbits=4, ef_search=256)
+            name = f"{index_type}/{storage}"
+            if not supports_removal(index_type):
+                ok = check_store(config, vectors, removed, probes)
+                print(f"{name}: rebuilt on removal, store {'ok' if ok else 'FAILED'}")
+            else:
+                raw, store = check_index(config, index_type, storage, vectors, removed, probes), \
+                    check_store(config, vectors, removed, probes)
+                ok = raw and store
+                print(f"{name}: index {'ok' if raw else 'FAILED'}, store {'ok' if store else 'FAILED'}")
+            failures += not ok
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,6 @@ using their 10-K filings with query decomposition and multi-step reasoning.
 """
 
 import os
-import json
 import warnings
 warnings.filterwarnings("ignore")
 
@@ -23,47 +22,47 @@ def main():
     
     # Initialize system
     rag_system = FinancialRAGSystem(groq_api_key)
+    try:
+        # Setup (this will take a few minutes)
+        rag_system.setup_system()
     
-    # Setup (this will take a few minutes)
-    rag_system.setup_system()
-    
-    # Run sample queries
-    print("\n" + "="*60)
-    print("RUNNING SAMPLE QUERIES")
-    print("="*60)
-    
-    results = rag_system.run_sample_queries()
+        # Run sample queries
+        print("\n" + "="*60)
+        print("RUNNING SAMPLE QUERIES")
+        print("="*60)
     
-    # Save results
-    with open('sample_results.json', 'w') as f:
-        json.dump([{
-            'query': r.query,
-            'answer': r.answer,
-            'reasoning': r.reasoning,
-            'sub_queries': r.sub_queries,
-            'sources': r.sources
-        } for r in results], f, indent=2)
+        # Results are appended to sample_results.jsonl as they complete; re-running resumes
+        rag_system.run_sample_queries(output_path='sample_results.jsonl')
     
-    print(f"\n✅ Results saved to sample_results.json")
+        print(f"\n✅ Results saved to sample_results.jsonl")
     
-    # Optional interactive mode (set NON_INTERACTIVE=1 to skip)
-    if os.getenv('NON_INTERACTIVE') != '1':
-        print("\n" + "="*60)
-        print("INTERACTIVE MODE - Enter your questions!")
-        print("Type 'quit' to exit")
-        print("="*60)
+        # Optional interactive mode (set NON_INTERACTIVE=1 to skip)
+        if os.getenv('NON_INTERACTIVE') != '1':
+            print("\n" + "="*60)
+            print("INTERACTIVE MODE - Enter your questions!")
+            print("Type 'quit' to exit")
+            print("="*60)
         
-        while True:
-            user_query = input("\n🔍 Your question: ").strip()
-            if user_query.lower() in ['quit', 'exit', 'q']:
-                break
+            while True:
+                user_query = input("\n🔍 Your question: ").strip()
+                if user_query.lower() in ['quit', 'exit', 'q']:
+                    break
             
-            if user_query:
-                result = rag_system.query(user_query)
-                print(f"\n💡 Answer: {result.answer}")
-                print(f"\n🔧 Reasoning: {result.reasoning}")
-                if len(result.sub_queries) > 1:
-                    print(f"\n📋 Sub-queries: {', '.join(result.sub_queries)}")
+                if user_query:
+                    print("\n💡 Answer: ", end="", flush=True)
+                    result = None
+                    for event in rag_system.query_stream(user_query):
+                        if event.type == "token":
+                            print(event.data, end="", flush=True)
+                        elif event.type == "result":
+                            result = event.data
+                    print()
+                    print(f"\n🔧 Reasoning: {result.reasoning}")
+                    if len(result.sub_queries) > 1:
+                        print(f"\n📋 Sub-queries: {', '.join(result.sub_queries)}")
+    finally:
+        # Saves the query embedding cache, so REPL questions are reused next run too
+        rag_system.close()
 
 
 if __name__ == "__main__":
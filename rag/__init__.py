@@ -1,5 +1,38 @@
-from .sec_data import SECDataAcquisition
-from .chunker import TextChunker
-from .vectorstore import VectorStore
-from .agent import QueryAgent, Document, QueryResult
-from .system import FinancialRAGSystem
\ No newline at end of file
+import importlib
+from typing import TYPE_CHECKING
+
+# Public names are imported on first access, so `import rag` stays cheap and
+# faiss, torch and the Groq client load only when something needs them.
+_EXPORTS = {
+    "SECDataAcquisition": ".sec_data",
+    "TextChunker": ".chunker",
+    "VectorStore": ".vectorstore",
+    "IndexConfig": ".index_backends",
+    "QueryAgent": ".agent",
+    "Document": ".chunker",
+    "QueryResult": ".agent",
+    "StreamEvent": ".agent",
+    "FinancialRAGSystem": ".system",
+}
+
+__all__ = list(_EXPORTS)
+
+if TYPE_CHECKING:
+    from .sec_data import SECDataAcquisition
+    from .chunker import TextChunker
+    from .vectorstore import VectorStore
+    from .index_backends import IndexConfig
+    from .agent import QueryAgent, Document, QueryResult, StreamEvent
+    from .system import FinancialRAGSystem
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,9 +1,29 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import contextvars
 import json
+import numpy as np
 
+from .answer_cache import SemanticAnswerCache
+from .batch import RateLimiter, aretry_with_backoff, retry_with_backoff
 from .chunker import Document
+from .context import ContextPacker
+from .llm_cache import CompletionCache
+from .metrics import QueryTracer, count, record_usage, span, use_trace
+from .planner import QueryPlanner
 from .vectorstore import VectorStore
+from .xbrl import FactsStore, answer_question, parse_question
+
+LLM_MODEL = "llama-3.1-8b-instant"
+LLM_TEMPERATURE = 0.1
+
+# Rate limiter and retry count for the LLM calls of one process_query call, overriding the agent's
+# own; executor work runs in a copy of the context, so it sees them too.
+_call_limits: "contextvars.ContextVar[Optional[Tuple[Optional[RateLimiter], int]]]" = contextvars.ContextVar(
+    "rag_llm_call_limits", default=None)
 
 
 @dataclass
@@ -13,26 +33,169 @@ class QueryResult:
     reasoning: str
     sub_queries: List[str]
     sources: List[Dict[str, Any]]
+    # Stage timings (ms), token counts and cache/retrieval hits; see rag.metrics.QueryTrace
+    metrics: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class StreamEvent:
+    """One streamed answer event: sources first, then tokens, then the final result"""
+    type: str
+    data: Any
 
 
 class QueryAgent:
     """Agent for query decomposition and multi-step reasoning"""
 
-    def __init__(self, vector_store: VectorStore, llm_client):
+    def __init__(self, vector_store: VectorStore, llm_client, search_mode: str = "hybrid",
+                 async_llm_client=None, retrieval_workers: int = 4,
+                 completion_cache: Optional[CompletionCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None, max_retries: int = 0,
+                 tracer: Optional[QueryTracer] = None, facts_store: Optional[FactsStore] = None,
+                 planner: Optional[QueryPlanner] = None, context_packer: Optional[ContextPacker] = None,
+                 direct_token_budget: int = 600, answer_cache: Optional[SemanticAnswerCache] = None):
         self.vector_store = vector_store
         self.llm_client = llm_client
+        self.async_llm_client = async_llm_client
+        self.completion_cache = completion_cache
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.search_mode = search_mode
+        self.model = LLM_MODEL
+        self.tracer = tracer or QueryTracer()
+        # Numeric questions (rankings, growth, ratios) are answered from XBRL facts when possible.
+        self.facts_store = facts_store
+        # Decomposes queries it can parse locally; only the rest go to the LLM.
+        self.planner = planner or QueryPlanner()
+        # Merges overlapping hits and packs prompt context under a token budget.
+        self.context_packer = context_packer or ContextPacker()
+        self.direct_token_budget = direct_token_budget
+        # Rephrasings of an earlier question reuse its answer while the corpus is unchanged.
+        self.answer_cache = answer_cache
+        # Retrieval (encoder + FAISS) is CPU-bound and releases the GIL in native code,
+        # so the async path runs it on a small shared thread pool.
+        self._executor = ThreadPoolExecutor(max_workers=retrieval_workers, thread_name_prefix="retrieval")
 
     def _needs_decomposition(self, query: str) -> bool:
-        indicators = [
-            "compare", "comparison", "versus", "vs", "which", "highest", "lowest",
-            "growth", "change", "difference", "all three", "across companies",
-            "from", "to", "between", "how much", "what percentage"
-        ]
-        query_lower = query.lower()
-        return any(indicator in query_lower for indicator in indicators)
+        return self.planner.needs_decomposition(query)
 
-    def _decompose_query(self, query: str) -> List[str]:
-        prompt = f"""
+    def _limits(self) -> Tuple[Optional[RateLimiter], int]:
+        limits = _call_limits.get()
+        return limits if limits is not None else (self.rate_limiter, self.max_retries)
+
+    @contextmanager
+    def _limits_override(self, rate_limiter: Optional[RateLimiter], max_retries: Optional[int]) -> Iterator[None]:
+        if rate_limiter is None and max_retries is None:
+            yield
+            return
+        token = _call_limits.set((rate_limiter or self.rate_limiter,
+                                  self.max_retries if max_retries is None else max_retries))
+        try:
+            yield
+        finally:
+            _call_limits.reset(token)
+
+    def _cache_key(self, prompt: str, max_tokens: int) -> Optional[str]:
+        if self.completion_cache is None or not self.completion_cache.enabled:
+            return None
+        return CompletionCache.key(self.model, prompt, LLM_TEMPERATURE, max_tokens)
+
+    def _chat(self, prompt: str, max_tokens: int) -> str:
+        cache_key = self._cache_key(prompt, max_tokens)
+        if cache_key is not None:
+            cached = self.completion_cache.get(cache_key)
+            count("llm_cache_hits" if cached is not None else "llm_cache_misses")
+            if cached is not None:
+                return cached
+        rate_limiter, max_retries = self._limits()
+
+        def call():
+            if rate_limiter is not None:
+                rate_limiter.acquire(prompt, max_tokens)
+            return self.llm_client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=LLM_TEMPERATURE,
+                max_tokens=max_tokens
+            )
+
+        with span("llm"):
+            response = retry_with_backoff(call, max_retries)
+        count("llm_calls")
+        record_usage(response)
+        content = response.choices[0].message.content.strip()
+        if cache_key is not None:
+            self.completion_cache.put(cache_key, content)
+        return content
+
+    def _chat_stream(self, prompt: str, max_tokens: int) -> Iterator[str]:
+        """Yield completion text as the LLM produces it; a cached completion is yielded whole"""
+        cache_key = self._cache_key(prompt, max_tokens)
+        if cache_key is not None:
+            cached = self.completion_cache.get(cache_key)
+            count("llm_cache_hits" if cached is not None else "llm_cache_misses")
+            if cached is not None:
+                yield cached
+                return
+        rate_limiter, max_retries = self._limits()
+
+        def call():
+            if rate_limiter is not None:
+                rate_limiter.acquire(prompt, max_tokens)
+            return self.llm_client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=LLM_TEMPERATURE,
+                max_tokens=max_tokens,
+                stream=True
+            )
+
+        # Only opening the stream is retried; a stream that fails midway has already emitted tokens.
+        with span("llm_first_token"):
+            stream = retry_with_backoff(call, max_retries)
+        count("llm_calls")
+        parts: List[str] = []
+        for chunk in stream:
+            record_usage(chunk)
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield delta
+        if cache_key is not None:
+            self.completion_cache.put(cache_key, "".join(parts).strip())
+
+    async def _achat(self, prompt: str, max_tokens: int) -> str:
+        if self.async_llm_client is None:
+            return await self._run_in_executor(self._chat, prompt, max_tokens)
+        cache_key = self._cache_key(prompt, max_tokens)
+        if cache_key is not None:
+            cached = self.completion_cache.get(cache_key)
+            count("llm_cache_hits" if cached is not None else "llm_cache_misses")
+            if cached is not None:
+                return cached
+        rate_limiter, max_retries = self._limits()
+
+        async def call():
+            if rate_limiter is not None:
+                await rate_limiter.aacquire(prompt, max_tokens)
+            return await self.async_llm_client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=LLM_TEMPERATURE,
+                max_tokens=max_tokens
+            )
+
+        with span("llm"):
+            response = await aretry_with_backoff(call, max_retries)
+        count("llm_calls")
+        record_usage(response)
+        content = response.choices[0].message.content.strip()
+        if cache_key is not None:
+            self.completion_cache.put(cache_key, content)
+        return content
+
+    def _decomposition_prompt(self, query: str) -> str:
+        return f"""
         Break down this financial query into specific sub-queries that can be answered independently.
         Each sub-query should be for a specific company and metric.
 
@@ -41,44 +204,83 @@ class QueryAgent:
         Return only a JSON list of sub-queries, nothing else.
         Example format: ["Microsoft total revenue 2023", "Google total revenue 2023"]
         """
-        try:
-            response = self.llm_client.chat.completions.create(
-                model="llama-3.1-8b-instant",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1,
-                max_tokens=200
-            )
-            content = response.choices[0].message.content.strip()
-            if content.startswith('[') and content.endswith(']'):
-                return json.loads(content)
-            lines = content.split('\n')
-            cleaned = []
-            for line in lines:
-                if line.strip() and not line.strip().startswith('#'):
-                    cleaned.append(line.strip().strip('"').strip("'"))
-            return cleaned[:6]
-        except Exception as e:
-            print(f"Error in query decomposition: {e}")
-            return [query]
+
+    def _parse_decomposition(self, content: str) -> List[str]:
+        if content.startswith('[') and content.endswith(']'):
+            return json.loads(content)
+        lines = content.split('\n')
+        cleaned = []
+        for line in lines:
+            if line.strip() and not line.strip().startswith('#'):
+                cleaned.append(line.strip().strip('"').strip("'"))
+        return cleaned[:6]
+
+    def _plan(self, query: str) -> Optional[List[str]]:
+        with span("plan"):
+            sub_queries = self.planner.plan(query)
+        count("planner_hits" if sub_queries is not None else "planner_misses")
+        return sub_queries
+
+    def _decompose_query(self, query: str) -> List[str]:
+        sub_queries = self._plan(query)
+        if sub_queries is not None:
+            return sub_queries
+        with span("decompose"):
+            try:
+                return self._parse_decomposition(self._chat(self._decomposition_prompt(query), max_tokens=200))
+            except Exception as e:
+                print(f"Error in query decomposition: {e}")
+                return [query]
+
+    async def _adecompose_query(self, query: str) -> List[str]:
+        """LLM decomposition only; the planner runs before this in _atext_result"""
+        with span("decompose"):
+            try:
+                return self._parse_decomposition(await self._achat(self._decomposition_prompt(query), max_tokens=200))
+            except Exception as e:
+                print(f"Error in query decomposition: {e}")
+                return [query]
 
     def _retrieve_for_query(self, query: str, k: int = 3):
-        return self.vector_store.search(query, k=k)
+        return self._retrieve_for_queries([query], k)[0]
 
-    def _synthesize_answer(self, query: str, sub_queries: List[str], all_results: List[List[Tuple[Document, float]]]) -> Dict[str, Any]:
-        context_parts: List[str] = []
-        sources: List[Dict[str, Any]] = []
-        for sub_query, results in zip(sub_queries, all_results):
-            context_parts.append(f"\n--- Results for: {sub_query} ---")
-            for doc, score in results:
-                context_parts.append(f"[{doc.company} {doc.year}]: {doc.content[:500]}...")
-                sources.append({
-                    "company": doc.company,
-                    "year": doc.year,
-                    "excerpt": doc.content[:200] + "...",
-                    "chunk_id": doc.chunk_id,
-                    "relevance_score": score
-                })
-        context = '\n'.join(context_parts)
+    def _retrieve_for_queries(self, queries: List[str], k: int = 3):
+        with span("retrieve"):
+            all_results = self.vector_store.search_batch(queries, k=k, mode=self.search_mode)
+        count("retrieval_hits", sum(len(results) for results in all_results))
+        return all_results
+
+    async def _run_in_executor(self, fn, *args):
+        # Executor threads do not inherit the caller's context; copy it so spans reach the query trace.
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, context.run, fn, *args)
+
+    async def _aretrieve_for_queries(self, queries: List[str], k: int = 3):
+        return await self._run_in_executor(self._retrieve_for_queries, queries, k)
+
+    @staticmethod
+    def _source(doc: Document, score: float) -> Dict[str, Any]:
+        # The score is on the search mode's scale: reciprocal-rank fusion (~0.01-0.033) for
+        # "hybrid", cosine similarity for "dense", BM25 for "lexical".
+        return {
+            "company": doc.company,
+            "year": doc.year,
+            "excerpt": doc.content[:200] + "...",
+            "chunk_id": doc.chunk_id,
+            "relevance_score": score
+        }
+
+    def _pack_context(self, sub_queries: List[str], all_results: List[List[Tuple[Document, float]]],
+                      token_budget: Optional[int] = None) -> str:
+        context, stats = self.context_packer.pack(sub_queries, all_results, token_budget)
+        count("context_tokens", stats["tokens"])
+        count("context_passages", stats["packed"])
+        return context
+
+    def _synthesis_prompt(self, query: str, sub_queries: List[str],
+                          all_results: List[List[Tuple[Document, float]]]) -> Tuple[str, List[Dict[str, Any]]]:
+        sources = [self._source(doc, score) for results in all_results for doc, score in results]
+        context = self._pack_context(sub_queries, all_results)
         prompt = f"""
         Based on the following financial document excerpts, provide a comprehensive answer to the query.
         Be specific with numbers and cite the companies/years when mentioning figures.
@@ -86,94 +288,281 @@ class QueryAgent:
         Query: {query}
 
         Context:
-        {context[:4000]}
+        {context}
 
         Provide a detailed, factual answer based only on the information in the context.
         If you cannot find specific information, state that clearly.
         """
-        try:
-            response = self.llm_client.chat.completions.create(
-                model="llama-3.1-8b-instant",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1,
-                max_tokens=500
-            )
-            answer = response.choices[0].message.content.strip()
-            reasoning = f"Executed {len(sub_queries)} sub-queries: {', '.join(sub_queries)}. Retrieved and analyzed relevant sections from SEC filings to provide comparative analysis."
+        return prompt, sources
+
+    def _synthesis_result(self, query: str, sub_queries: List[str], sources: List[Dict[str, Any]],
+                          answer: Optional[str], error: Optional[Exception] = None) -> Dict[str, Any]:
+        if error is not None:
+            print(f"Error in answer synthesis: {error}")
             return {
                 "query": query,
-                "answer": answer,
-                "reasoning": reasoning,
+                "answer": f"Error generating answer: {error}",
+                "reasoning": "Error in synthesis step",
                 "sub_queries": sub_queries,
-                "sources": sources[:10]
+                "sources": sources[:5]
             }
+        reasoning = f"Executed {len(sub_queries)} sub-queries: {', '.join(sub_queries)}. Retrieved and analyzed relevant sections from SEC filings to provide comparative analysis."
+        return {
+            "query": query,
+            "answer": answer,
+            "reasoning": reasoning,
+            "sub_queries": sub_queries,
+            "sources": sources[:10]
+        }
+
+    def _synthesize_answer(self, query: str, sub_queries: List[str], all_results: List[List[Tuple[Document, float]]]) -> Dict[str, Any]:
+        with span("prompt"):
+            prompt, sources = self._synthesis_prompt(query, sub_queries, all_results)
+        try:
+            answer = self._chat(prompt, max_tokens=500)
         except Exception as e:
-            print(f"Error in answer synthesis: {e}")
+            return self._synthesis_result(query, sub_queries, sources, None, e)
+        return self._synthesis_result(query, sub_queries, sources, answer)
+
+    async def _asynthesize_answer(self, query: str, sub_queries: List[str], all_results: List[List[Tuple[Document, float]]]) -> Dict[str, Any]:
+        with span("prompt"):
+            prompt, sources = self._synthesis_prompt(query, sub_queries, all_results)
+        try:
+            answer = await self._achat(prompt, max_tokens=500)
+        except Exception as e:
+            return self._synthesis_result(query, sub_queries, sources, None, e)
+        return self._synthesis_result(query, sub_queries, sources, answer)
+
+    def _direct_prompt(self, query: str, results: List[Tuple[Document, float]]) -> str:
+        context = self._pack_context([query], [results], self.direct_token_budget)
+        return f"""
+                Answer this financial question based on the provided context.
+                Be specific and cite companies/years for any numbers mentioned.
+
+                Question: {query}
+                Context: {context}
+
+                Provide a direct, factual answer.
+                """
+
+    def _direct_result(self, query: str, results: List[Tuple[Document, float]], answer: Optional[str]) -> Dict[str, Any]:
+        if not results:
             return {
                 "query": query,
-                "answer": f"Error generating answer: {e}",
-                "reasoning": "Error in synthesis step",
-                "sub_queries": sub_queries,
-                "sources": sources[:5]
+                "answer": "No relevant information found in the vector store.",
+                "reasoning": "No matching documents found",
+                "sub_queries": [query],
+                "sources": []
             }
+        return {
+            "query": query,
+            "answer": answer,
+            "reasoning": "Direct retrieval from vector store with single-step reasoning",
+            "sub_queries": [query],
+            "sources": [self._source(doc, score) for doc, score in results[:5]]
+        }
 
-    def process_query(self, query: str) -> QueryResult:
-        print(f"\n=== Processing Query: {query} ===")
+    def _decompose_and_retrieve(self, query: str) -> Tuple[List[str], List[List[Tuple[Document, float]]]]:
+        print("Query needs decomposition...")
+        sub_queries = self._decompose_query(query)
+        print(f"Sub-queries: {sub_queries}")
+        all_results = self._retrieve_for_queries(sub_queries, k=3)
+        for sub_query, results in zip(sub_queries, all_results):
+            print(f"Retrieved {len(results)} results for: {sub_query}")
+        return sub_queries, all_results
+
+    def _answer_direct(self, query: str, results: List[Tuple[Document, float]]) -> Optional[str]:
+        if not results:
+            return None
+        with span("prompt"):
+            prompt = self._direct_prompt(query, results)
+        try:
+            return self._chat(prompt, max_tokens=300)
+        except Exception as e:
+            return f"Error generating answer: {e}"
+
+    async def _aanswer_direct(self, query: str, results: List[Tuple[Document, float]]) -> Optional[str]:
+        if not results:
+            return None
+        with span("prompt"):
+            prompt = self._direct_prompt(query, results)
+        try:
+            return await self._achat(prompt, max_tokens=300)
+        except Exception as e:
+            return f"Error generating answer: {e}"
+
+    def _facts_result(self, query: str) -> Optional[Dict[str, Any]]:
+        """Answer from the XBRL facts store without retrieval or an LLM call, if the question allows"""
+        if self.facts_store is None or not len(self.facts_store):
+            return None
+        with span("facts"):
+            question = parse_question(query, self.facts_store.companies)
+            answer = answer_question(self.facts_store, question) if question is not None else None
+        count("facts_hits" if answer is not None else "facts_misses")
+        if answer is None:
+            return None
+        print("Answered from XBRL facts")
+        return {"query": query, "sub_queries": [query], **answer}
+
+    def _lookup_answer(self, query: str) -> Tuple[Optional[Dict[str, Any]], Optional[Tuple[np.ndarray, int]]]:
+        """A cached answer to a question like `query`, and the (embedding, corpus version) to store
+        a fresh answer under; the version is read first, so an answer built while documents are
+        added is stored as stale"""
+        if self.answer_cache is None:
+            return None, None
+        version = self.vector_store.version
+        with span("answer_cache"):
+            embedding = self.vector_store.encode_query(query)
+            cached = self.answer_cache.lookup(query, embedding, version)
+        count("answer_cache_hits" if cached is not None else "answer_cache_misses")
+        if cached is None:
+            return None, (embedding, version)
+        print("Answered from semantic answer cache")
+        cached["query"] = query
+        return cached, None
+
+    def _store_answer(self, query: str, key: Optional[Tuple[np.ndarray, int]], result_dict: Dict[str, Any]):
+        answer = result_dict["answer"]
+        # Errors and empty retrievals are not worth repeating.
+        if key is None or not result_dict["sources"] or not answer or answer.startswith("Error"):
+            return
+        embedding, version = key
+        self.answer_cache.store(query, embedding, version, result_dict)
+
+    def _cached_text_result(self, query: str) -> Dict[str, Any]:
+        cached, key = self._lookup_answer(query)
+        if cached is not None:
+            return cached
+        result_dict = self._text_result(query)
+        self._store_answer(query, key, result_dict)
+        return result_dict
+
+    async def _acached_text_result(self, query: str) -> Dict[str, Any]:
+        cached, key = await self._run_in_executor(self._lookup_answer, query)
+        if cached is not None:
+            return cached
+        result_dict = await self._atext_result(query)
+        self._store_answer(query, key, result_dict)
+        return result_dict
+
+    def _text_result(self, query: str) -> Dict[str, Any]:
+        if self._needs_decomposition(query):
+            sub_queries, all_results = self._decompose_and_retrieve(query)
+            return self._synthesize_answer(query, sub_queries, all_results)
+        print("Simple query, direct retrieval...")
+        results = self._retrieve_for_query(query, k=5)
+        return self._direct_result(query, results, self._answer_direct(query, results))
+
+    async def _atext_result(self, query: str) -> Dict[str, Any]:
+        """When decomposition needs the LLM, retrieval for the original query starts while that
+        call is in flight, so a decomposition that falls back to the original query costs no
+        extra retrieval latency.
+        """
         if self._needs_decomposition(query):
             print("Query needs decomposition...")
-            sub_queries = self._decompose_query(query)
-            print(f"Sub-queries: {sub_queries}")
-            all_results = []
-            for sub_query in sub_queries:
-                results = self._retrieve_for_query(sub_query, k=3)
-                all_results.append(results)
+            sub_queries = self._plan(query)
+            if sub_queries is not None:
+                print(f"Sub-queries: {sub_queries}")
+                all_results = await self._aretrieve_for_queries(sub_queries, k=3)
+            else:
+                speculative = asyncio.ensure_future(self._aretrieve_for_queries([query], k=3))
+                sub_queries = await self._adecompose_query(query)
+                print(f"Sub-queries: {sub_queries}")
+                if sub_queries == [query]:
+                    all_results = await speculative
+                else:
+                    all_results = await self._aretrieve_for_queries(sub_queries, k=3)
+                    # Retrieval already running in the pool cannot be interrupted; let it finish unobserved.
+                    speculative.cancel()
+            for sub_query, results in zip(sub_queries, all_results):
                 print(f"Retrieved {len(results)} results for: {sub_query}")
-            result_dict = self._synthesize_answer(query, sub_queries, all_results)
+            return await self._asynthesize_answer(query, sub_queries, all_results)
+        print("Simple query, direct retrieval...")
+        results = (await self._aretrieve_for_queries([query], k=5))[0]
+        return self._direct_result(query, results, await self._aanswer_direct(query, results))
+
+    def process_query(self, query: str, rate_limiter: Optional[RateLimiter] = None,
+                      max_retries: Optional[int] = None) -> QueryResult:
+        """Answer one query; `rate_limiter`/`max_retries` override the agent's for this call only"""
+        print(f"\n=== Processing Query: {query} ===")
+        with self._limits_override(rate_limiter, max_retries), self.tracer.trace(query) as trace:
+            result_dict = self._facts_result(query) or self._cached_text_result(query)
+        return QueryResult(**result_dict, metrics=trace.to_dict())
+
+    async def aprocess_query(self, query: str, rate_limiter: Optional[RateLimiter] = None,
+                             max_retries: Optional[int] = None) -> QueryResult:
+        """Async variant of process_query; many queries can run concurrently on one event loop"""
+        print(f"\n=== Processing Query: {query} ===")
+        with self._limits_override(rate_limiter, max_retries), self.tracer.trace(query) as trace:
+            result_dict = self._facts_result(query) or await self._acached_text_result(query)
+        return QueryResult(**result_dict, metrics=trace.to_dict())
+
+    def stream_query(self, query: str) -> Iterator[StreamEvent]:
+        """Streaming variant of process_query.
+
+        Yields the retrieved sources as soon as retrieval finishes, then answer tokens as the
+        LLM produces them, and finally the assembled QueryResult. An answer that was not
+        streamed (facts store, answer cache, no retrieval hits, LLM error) arrives as one token.
+        """
+        print(f"\n=== Processing Query: {query} ===")
+        # A streamed query's total also counts the time the consumer spends between tokens. The
+        # trace is current only while a step runs, never across a yield, so interleaved streams
+        # and steps driven from other contexts (e.g. pool threads) each keep their own.
+        with self.tracer.trace(query, activate=False) as trace:
+            steps = self._stream_events(query)
+            try:
+                while True:
+                    with use_trace(trace):
+                        try:
+                            event = next(steps)
+                        except StopIteration as stop:
+                            result_dict = stop.value
+                            break
+                    yield event
+            finally:
+                with use_trace(trace):
+                    steps.close()
+        yield StreamEvent("result", QueryResult(**result_dict, metrics=trace.to_dict()))
+
+    def _stream_events(self, query: str) -> Iterator[StreamEvent]:
+        """The steps of stream_query up to its result; returns the result dict"""
+        parts: List[str] = []
+        result_dict, cache_key = self._facts_result(query), None
+        if result_dict is None:
+            result_dict, cache_key = self._lookup_answer(query)
+        if result_dict is not None:
+            yield StreamEvent("sources", result_dict["sources"][:10])
+        elif self._needs_decomposition(query):
+            sub_queries, all_results = self._decompose_and_retrieve(query)
+            with span("prompt"):
+                prompt, sources = self._synthesis_prompt(query, sub_queries, all_results)
+            yield StreamEvent("sources", sources[:10])
+            try:
+                for token in self._chat_stream(prompt, max_tokens=500):
+                    parts.append(token)
+                    yield StreamEvent("token", token)
+                result_dict = self._synthesis_result(query, sub_queries, sources, "".join(parts).strip())
+            except Exception as e:
+                result_dict = self._synthesis_result(query, sub_queries, sources, None, e)
         else:
             print("Simple query, direct retrieval...")
             results = self._retrieve_for_query(query, k=5)
+            yield StreamEvent("sources", [self._source(doc, score) for doc, score in results[:5]])
+            answer = None
             if results:
-                context = '\n'.join([f"[{doc.company} {doc.year}]: {doc.content[:300]}..." for doc, score in results])
-                prompt = f"""
-                Answer this financial question based on the provided context.
-                Be specific and cite companies/years for any numbers mentioned.
-
-                Question: {query}
-                Context: {context}
-
-                Provide a direct, factual answer.
-                """
+                with span("prompt"):
+                    prompt = self._direct_prompt(query, results)
                 try:
-                    response = self.llm_client.chat.completions.create(
-                        model="llama-3.1-8b-instant",
-                        messages=[{"role": "user", "content": prompt}],
-                        temperature=0.1,
-                        max_tokens=300
-                    )
-                    answer = response.choices[0].message.content.strip()
+                    for token in self._chat_stream(prompt, max_tokens=300):
+                        parts.append(token)
+                        yield StreamEvent("token", token)
+                    answer = "".join(parts).strip()
                 except Exception as e:
                     answer = f"Error generating answer: {e}"
-                result_dict = {
-                    "query": query,
-                    "answer": answer,
-                    "reasoning": "Direct retrieval from vector store with single-step reasoning",
-                    "sub_queries": [query],
-                    "sources": [{
-                        "company": doc.company,
-                        "year": doc.year,
-                        "excerpt": doc.content[:200] + "...",
-                        "chunk_id": doc.chunk_id,
-                        "relevance_score": score
-                    } for doc, score in results[:5]]
-                }
-            else:
-                result_dict = {
-                    "query": query,
-                    "answer": "No relevant information found in the vector store.",
-                    "reasoning": "No matching documents found",
-                    "sub_queries": [query],
-                    "sources": []
-                }
-        return QueryResult(**result_dict)
-
-
+            result_dict = self._direct_result(query, results, answer)
+        self._store_answer(query, cache_key, result_dict)
+        streamed = "".join(parts).strip()
+        if result_dict["answer"] != streamed:
+            # An error after some tokens follows them on a new line.
+            yield StreamEvent("token", ("\n" if streamed else "") + result_dict["answer"])
+        return result_dict
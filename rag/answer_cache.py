@@ -0,0 +1,117 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import copy
+import threading
+import numpy as np
+
+from .lazy_import import LazyModule
+from .lexicon import METRIC_MATCHER, RANK_MATCHER, find_companies, find_years
+
+faiss = LazyModule("faiss")
+
+
+def query_signature(query: str) -> Tuple[Tuple[str, ...], ...]:
+    """Companies, years, metrics and ranking direction named by a query.
+
+    Questions that differ only in these ("NVIDIA revenue 2023" vs "2024", "highest" vs
+    "lowest") embed almost identically, so a cached answer is only reused when they match.
+    """
+    return (tuple(sorted(find_companies(query))), tuple(sorted(find_years(query))),
+            tuple(sorted(METRIC_MATCHER.values(query))), tuple(sorted(RANK_MATCHER.values(query))))
+
+
+class SemanticAnswerCache:
+    """Answers of earlier queries, found by embedding similarity to a new query.
+
+    Query embeddings (L2-normalized, so inner product is cosine similarity) go into a small
+    FAISS flat index; a lookup returns the stored answer of the nearest earlier query whose
+    similarity is at least `threshold` and whose query_signature matches. Every entry belongs
+    to one corpus version (VectorStore.version); a lookup or insert under a newer version
+    drops all entries, so answers never outlive the documents they were built from. Versions
+    only grow, so a request that read an older version misses and its answer is not stored.
+    The least recently used entry is evicted beyond `capacity`.
+    """
+
+    def __init__(self, threshold: float = 0.92, capacity: int = 1024, candidates: int = 4):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.candidates = candidates
+        self.version: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.index: Optional[faiss.Index] = None
+        # FAISS id -> (signature, result dict), least recently used first
+        self._entries: "OrderedDict[int, Tuple[Tuple, Dict[str, Any]]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _check_version(self, version: int) -> bool:
+        """Move to `version` if it is newer; False if it is older than the cache's"""
+        if self.version is not None and version < self.version:
+            return False
+        if version != self.version:
+            if self._entries:
+                self.invalidations += 1
+            self._reset()
+            self.version = version
+        return True
+
+    def _reset(self):
+        if self.index is not None:
+            self.index.reset()
+        self._entries.clear()
+
+    def lookup(self, query: str, embedding: np.ndarray, version: int) -> Optional[Dict[str, Any]]:
+        """A copy of the cached result for a query like `query`, or None"""
+        signature = query_signature(query)
+        with self._lock:
+            found = None
+            if self._check_version(version) and self._entries:
+                scores, ids = self.index.search(embedding.reshape(1, -1), min(self.candidates, len(self._entries)))
+                for score, entry_id in zip(scores[0], ids[0]):
+                    if entry_id < 0 or score < self.threshold:
+                        break
+                    if self._entries[entry_id][0] == signature:
+                        self._entries.move_to_end(entry_id)
+                        found = self._entries[entry_id][1]
+                        break
+            if found is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return copy.deepcopy(found)
+
+    def store(self, query: str, embedding: np.ndarray, version: int, result: Dict[str, Any]):
+        vector = np.ascontiguousarray(embedding, dtype=np.float32).reshape(1, -1)
+        entry = (query_signature(query), copy.deepcopy(result))
+        with self._lock:
+            if not self._check_version(version):
+                # Built before a corpus update; entries valid under the newer version stay.
+                return
+            if self.index is None:
+                self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+            entry_id = self._next_id
+            self._next_id += 1
+            self.index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = entry
+            if len(self._entries) > self.capacity:
+                evicted, _ = self._entries.popitem(last=False)
+                self.index.remove_ids(np.array([evicted], dtype=np.int64))
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,116 @@
+from typing import Callable, Optional, TypeVar
+import asyncio
+import random
+import threading
+import time
+
+T = TypeVar("T")
+
+# HTTP statuses worth retrying: throttling and transient server errors
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+
+class TokenBucket:
+    """Thread-safe token bucket that refills continuously up to `capacity`"""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """Take `amount` tokens now and return how long the caller must wait before using them.
+
+        The balance may go negative, which queues later callers behind earlier ones in order.
+        """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_per_second)
+            self._updated = now
+            self._tokens -= amount
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.refill_per_second
+
+    def acquire(self, amount: float = 1.0):
+        wait = self.reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, amount: float = 1.0):
+        wait = self.reserve(amount)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class RateLimiter:
+    """Requests-per-minute and (optionally) tokens-per-minute limits for LLM calls"""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: Optional[float] = None):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0) if tokens_per_minute else None
+
+    @staticmethod
+    def estimate_tokens(prompt: str, max_tokens: int) -> int:
+        # ~4 characters per token for English prompts, plus the completion budget.
+        return len(prompt) // 4 + max_tokens
+
+    def acquire(self, prompt: str, max_tokens: int):
+        wait = self.requests.reserve()
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(self.estimate_tokens(prompt, max_tokens)))
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, prompt: str, max_tokens: int):
+        wait = self.requests.reserve()
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(self.estimate_tokens(prompt, max_tokens)))
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def _backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    return min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether a failed call may succeed if repeated: rate limits, timeouts, connection failures
+    and 5xx responses, but not other 4xx, authentication or validation errors"""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in RETRY_STATUSES
+    # Client transport errors without a response, e.g. groq.APIConnectionError and APITimeoutError
+    return any("Timeout" in cls.__name__ or "Connection" in cls.__name__ for cls in type(error).__mro__)
+
+
+def retry_with_backoff(fn: Callable[[], T], max_retries: int, base_delay: float = 1.0,
+                       max_delay: float = 30.0) -> T:
+    """Call fn, retrying transient failures up to max_retries times with jittered exponential backoff"""
+    for attempt in range(max_retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == max_retries or not is_transient(e):
+                raise
+            delay = _backoff_delay(attempt, base_delay, max_delay)
+            print(f"LLM call failed ({e}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+
+async def aretry_with_backoff(fn, max_retries: int, base_delay: float = 1.0, max_delay: float = 30.0):
+    """Async counterpart of retry_with_backoff; fn returns an awaitable"""
+    for attempt in range(max_retries + 1):
+        try:
+            return await fn()
+        except Exception as e:
+            if attempt == max_retries or not is_transient(e):
+                raise
+            delay = _backoff_delay(attempt, base_delay, max_delay)
+            print(f"LLM call failed ({e}), retrying in {delay:.1f}s...")
+            await asyncio.sleep(delay)
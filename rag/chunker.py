@@ -1,6 +1,10 @@
 import re
+from collections import deque
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+_WORD = re.compile(r'\S+')
 
 
 @dataclass
@@ -11,6 +15,32 @@ class Document:
     source: str
     chunk_id: str
     page: Optional[int] = None
+    # Character offsets of the chunk in its source text, when known
+    start: Optional[int] = None
+    end: Optional[int] = None
+
+
+class SpanDocument(Document):
+    """Document whose content is sliced from a shared source text only when it is read"""
+
+    def __init__(self, text: str, start: int, end: int, company: str, year: str, source: str, chunk_id: str):
+        self._text = text
+        super().__init__(None, company, year, source, chunk_id, None, start, end)
+
+    @property
+    def content(self) -> str:
+        if self._content is None:
+            return self._text[self.start:self.end]
+        return self._content
+
+    @content.setter
+    def content(self, value: Optional[str]):
+        self._content = value
+
+    def __reduce__(self):
+        # Pickle as a plain Document so worker processes don't ship the whole source text per chunk
+        return Document, (self.content, self.company, self.year, self.source, self.chunk_id,
+                          self.page, self.start, self.end)
 
 
 class TextChunker:
@@ -20,45 +50,167 @@ class TextChunker:
         self.chunk_size = chunk_size
         self.overlap = overlap
 
+    def config(self) -> Dict[str, Any]:
+        """Parameters that determine chunk boundaries, used to key index snapshots"""
+        return {"type": type(self).__name__, "chunk_size": self.chunk_size, "overlap": self.overlap,
+                "content": "spans"}
+
     def chunk_text(self, text: str, company: str, year: str, source: str) -> List[Document]:
-        sentences = re.split(r'(?<=[.!?])\s+', text)
+        return list(self.iter_chunks(text, company, year, source))
+
+    @staticmethod
+    def _sentence_spans(text: str) -> Iterator[Tuple[int, int, int]]:
+        """(start, end, word count) of each sentence, trimmed to the text's non-blank extent"""
+        lo = len(text) - len(text.lstrip())
+        hi = len(text.rstrip())
+        position = 0
+        for match in _SENTENCE_BREAK.finditer(text):
+            yield position, match.start(), len(text[position:match.start()].split())
+            position = match.end()
+        start, end = max(position, lo), max(min(len(text), hi), lo)
+        yield start, max(start, end), len(text[start:end].split())
+
+    def _overlap_window(self, text: str, window: Deque[Tuple[int, int, int]],
+                        keep: int) -> Deque[Tuple[int, int, int]]:
+        """Spans covering the last `keep` words of the window"""
+        kept: Deque[Tuple[int, int, int]] = deque()
+        for start, end, words in reversed(window):
+            if keep <= 0:
+                break
+            if words > keep:
+                skip = words - keep
+                for i, match in enumerate(_WORD.finditer(text, start, end)):
+                    if i == skip:
+                        start = match.start()
+                        break
+                words = keep
+            kept.appendleft((start, end, words))
+            keep -= words
+        return kept
 
-        chunks: List[Document] = []
-        current_chunk = ""
-        current_size = 0
+    def iter_chunks(self, text: str, company: str, year: str, source: str) -> Iterator[Document]:
+        """Yield chunks lazily as views into `text`.
+
+        Keeps a rolling window of sentence spans with running word counts, so each
+        sentence is scanned once; chunk boundaries are the same as the word-count
+        splitting used before, but whitespace inside a chunk is kept as in the source.
+        That holds for overlap >= 1. With overlap 0 the old `words[-0:]` slice carried
+        the whole previous chunk forward; here each chunk starts after the last one.
+        """
+        window: Deque[Tuple[int, int, int]] = deque()
+        size = 0
         chunk_id = 0
+        first = True
+
+        def make_chunk() -> SpanDocument:
+            start = _WORD.search(text, window[0][0], window[0][1]).start()
+            return SpanDocument(text, start, window[-1][1], company, year, source,
+                                f"{company}_{year}_{chunk_id}")
 
-        for sentence in sentences:
-            sentence_size = len(sentence.split())
-            if current_size + sentence_size > self.chunk_size and current_chunk:
-                doc = Document(
-                    content=current_chunk.strip(),
-                    company=company,
-                    year=year,
-                    source=source,
-                    chunk_id=f"{company}_{year}_{chunk_id}"
-                )
-                chunks.append(doc)
-
-                words = current_chunk.split()
-                overlap_text = ' '.join(words[-self.overlap:]) if len(words) > self.overlap else current_chunk
-                current_chunk = overlap_text + " " + sentence
-                current_size = len(current_chunk.split())
+        for span in self._sentence_spans(text):
+            sentence_size = span[2]
+            if size + sentence_size > self.chunk_size and not first:
+                if size:
+                    yield make_chunk()
+                window = self._overlap_window(text, window, min(size, self.overlap))
+                size = sum(words for _, _, words in window)
                 chunk_id += 1
-            else:
-                current_chunk += " " + sentence
-                current_size += sentence_size
+            first = False
+            if sentence_size:
+                window.append(span)
+                size += sentence_size
+
+        if size:
+            yield make_chunk()
 
-        if current_chunk.strip():
-            doc = Document(
-                content=current_chunk.strip(),
-                company=company,
-                year=year,
-                source=source,
-                chunk_id=f"{company}_{year}_{chunk_id}"
-            )
-            chunks.append(doc)
 
-        return chunks
+class TokenChunker(TextChunker):
+    """Sentence-aware chunking sized in the embedding model's own tokens.
+
+    Sentences are tokenized in batches with a fast (offset-mapping) Hugging Face tokenizer and
+    packed so that no chunk exceeds `max_tokens`, the encoder's input limit; sentences longer
+    than that are split at word boundaries. Consecutive chunks share `overlap` tokens.
+    """
+
+    def __init__(self, tokenizer: Any, max_tokens: int = 254, overlap: int = 32, batch_size: int = 512):
+        if not 0 <= overlap < max_tokens:
+            raise ValueError(f"overlap must be in [0, max_tokens), got {overlap} for max_tokens={max_tokens}")
+        super().__init__(chunk_size=max_tokens, overlap=overlap)
+        self.tokenizer = tokenizer
+        self.batch_size = batch_size
+
+    def config(self) -> Dict[str, Any]:
+        config = super().config()
+        config["tokenizer"] = getattr(self.tokenizer, "name_or_path", type(self.tokenizer).__name__)
+        return config
+
+    def _token_offsets(self, text: str) -> Tuple[List[int], List[int], List[int]]:
+        """Absolute start/end offsets of every token, and the index one past each sentence's last token"""
+        spans = [(start, end) for start, end, words in self._sentence_spans(text) if words]
+        starts: List[int] = []
+        ends: List[int] = []
+        sentence_ends: List[int] = []
+        for i in range(0, len(spans), self.batch_size):
+            batch = spans[i:i + self.batch_size]
+            encoded = self.tokenizer([text[start:end] for start, end in batch], add_special_tokens=False,
+                                     return_offsets_mapping=True, return_attention_mask=False,
+                                     return_token_type_ids=False)
+            for (base, _), offsets in zip(batch, encoded["offset_mapping"]):
+                for token_start, token_end in offsets:
+                    starts.append(base + token_start)
+                    ends.append(base + token_end)
+                sentence_ends.append(len(starts))
+        return starts, ends, sentence_ends
+
+    def iter_chunks(self, text: str, company: str, year: str, source: str) -> Iterator[Document]:
+        starts, ends, sentence_ends = self._token_offsets(text)
+        chunk_id = 0
+
+        def word_start(token: int, lowest: int) -> int:
+            # Step back over word pieces so a cut never falls inside a word; keep `token` if the word is too long
+            candidate = token
+            while candidate > lowest and starts[candidate] == ends[candidate - 1]:
+                candidate -= 1
+            return candidate if candidate > lowest else token
+
+        def make_chunk(first: int, last: int) -> SpanDocument:
+            return SpanDocument(text, starts[first], ends[last - 1], company, year, source,
+                                f"{company}_{year}_{chunk_id}")
+
+        first = last = 0  # current chunk is tokens [first, last)
+        for sentence_end in sentence_ends:
+            if sentence_end - first > self.chunk_size and last > first:
+                yield make_chunk(first, last)
+                chunk_id += 1
+                # A chunk no longer than the overlap is not repeated; the next one starts after it
+                first = word_start(last - self.overlap, first) if last - self.overlap > first else last
+            while sentence_end - first > self.chunk_size:
+                cut = word_start(first + self.chunk_size, first)
+                yield make_chunk(first, cut)
+                chunk_id += 1
+                first = max(first + 1, word_start(cut - self.overlap, first))
+            last = sentence_end
+
+        if last > first:
+            yield make_chunk(first, last)
 
 
+def truncation_report(texts: List[str], tokenizer: Any, max_tokens: int, batch_size: int = 512) -> Dict[str, Any]:
+    """How much of each text an encoder limited to `max_tokens` would silently drop"""
+    chunks = truncated = tokens = dropped = 0
+    for i in range(0, len(texts), batch_size):
+        encoded = tokenizer(texts[i:i + batch_size], add_special_tokens=False, return_attention_mask=False,
+                            return_token_type_ids=False)
+        for ids in encoded["input_ids"]:
+            chunks += 1
+            tokens += len(ids)
+            if len(ids) > max_tokens:
+                truncated += 1
+                dropped += len(ids) - max_tokens
+    return {
+        "chunks": chunks,
+        "truncated_chunks": truncated,
+        "tokens": tokens,
+        "dropped_tokens": dropped,
+        "dropped_fraction": dropped / tokens if tokens else 0.0,
+    }
@@ -0,0 +1,231 @@
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import os
+import re
+import threading
+
+from .chunker import Document
+
+# Character-per-token ratio of the fallback estimate, typical for English BPE vocabularies.
+CHARS_PER_TOKEN = 4
+_WORD = re.compile(r"\w+")
+
+
+class TokenCounter:
+    """Counts prompt tokens with the best tokenizer available.
+
+    Tries, in order: a Hugging Face tokenizer named by `tokenizer` or RAG_LLM_TOKENIZER (a
+    tokenizer.json path or hub id, e.g. the Llama 3.1 tokenizer the Groq model uses), tiktoken's
+    cl100k_base (a BPE vocabulary close to Llama 3's), and a characters / 4 estimate. The
+    tokenizer loads on first use.
+    """
+
+    def __init__(self, tokenizer: Optional[str] = None):
+        self.tokenizer = tokenizer or os.getenv("RAG_LLM_TOKENIZER")
+        self.backend: Optional[str] = None
+        self._encode: Optional[Callable[[str], int]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Callable[[str], int]:
+        if self.tokenizer:
+            try:
+                from tokenizers import Tokenizer
+                hf = (Tokenizer.from_file(self.tokenizer) if os.path.isfile(self.tokenizer)
+                      else Tokenizer.from_pretrained(self.tokenizer))
+                self.backend = f"tokenizers:{self.tokenizer}"
+                return lambda text: len(hf.encode(text, add_special_tokens=False).ids)
+            except Exception as e:
+                print(f"⚠️ Could not load tokenizer {self.tokenizer}: {e}")
+        try:
+            import tiktoken
+            encoding = tiktoken.get_encoding("cl100k_base")
+            self.backend = "tiktoken:cl100k_base"
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+        except Exception:
+            self.backend = "estimate"
+            return lambda text: -(-len(text) // CHARS_PER_TOKEN)
+
+    def count(self, text: str) -> int:
+        if self._encode is None:
+            with self._lock:
+                if self._encode is None:
+                    self._encode = self._load()
+        return self._encode(text)
+
+
+@dataclass
+class Passage:
+    """Contiguous filing text assembled from one or more retrieved chunks"""
+    text: str
+    company: str
+    year: str
+    source: str
+    start: Optional[int]
+    end: Optional[int]
+    score: float
+    # Best rank of this passage in each sub-query that retrieved it.
+    ranks: Dict[int, int] = field(default_factory=dict)
+    chunk_ids: List[str] = field(default_factory=list)
+
+    @property
+    def best_rank(self) -> int:
+        return min(self.ranks.values())
+
+    def absorb(self, other: "Passage"):
+        for sub_query, rank in other.ranks.items():
+            self.ranks[sub_query] = min(rank, self.ranks.get(sub_query, rank))
+        self.score = max(self.score, other.score)
+        self.chunk_ids.extend(other.chunk_ids)
+
+    def render(self) -> str:
+        return f"[{self.company} {self.year}]: {self.text.strip()}"
+
+
+def _shingles(text: str, size: int = 5) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class ContextPacker:
+    """Builds the synthesis context from retrieved chunks under a token budget.
+
+    Each hit contributes the head of its chunk, up to `passage_tokens` (the part the encoder
+    embedded, so the part its score describes). Heads from the same filing whose character
+    offsets overlap or touch are merged, so the chunker's overlap is sent once, and passages
+    whose word 5-grams are mostly contained in a better passage are dropped. Passages are then
+    packed round-robin across sub-queries in rank order: every sub-query gets its best passage
+    in before any gets a second, and a passage retrieved by several sub-queries counts for each.
+    """
+
+    def __init__(self, token_budget: int = 1200, passage_tokens: int = 256, counter: Optional[TokenCounter] = None,
+                 duplicate_threshold: float = 0.8, min_passage_tokens: int = 48):
+        self.token_budget = token_budget
+        self.passage_tokens = passage_tokens
+        self.counter = counter or TokenCounter()
+        self.duplicate_threshold = duplicate_threshold
+        self.min_passage_tokens = min_passage_tokens
+
+    def _clip(self, text: str, budget: int) -> str:
+        """Longest prefix of whole words within `budget` tokens"""
+        if self.counter.count(text) <= budget:
+            return text
+        # Cut by the token ratio, then tighten until it fits.
+        words = list(re.finditer(r"\S+", text))
+        keep = len(words) * budget // max(self.counter.count(text), 1)
+        while keep > 0 and self.counter.count(text[:words[keep - 1].end()]) > budget:
+            keep = keep * 9 // 10
+        return text[:words[keep - 1].end()] if keep else ""
+
+    def passages(self, all_results: Sequence[Sequence[Tuple[Document, float]]]) -> List[Passage]:
+        """Merge and de-duplicate the hits of every sub-query, best first"""
+        by_chunk: Dict[str, Passage] = {}
+        for sub_query, results in enumerate(all_results):
+            for rank, (doc, score) in enumerate(results):
+                hit = by_chunk.get(doc.chunk_id)
+                if hit is None:
+                    text = self._clip(doc.content, self.passage_tokens)
+                    end = doc.start + len(text) if doc.start is not None else None
+                    by_chunk[doc.chunk_id] = Passage(text, doc.company, doc.year, doc.source, doc.start, end,
+                                                     score, {sub_query: rank}, [doc.chunk_id])
+                else:
+                    hit.ranks[sub_query] = min(rank, hit.ranks.get(sub_query, rank))
+                    hit.score = max(hit.score, score)
+
+        merged: List[Passage] = []
+        by_source: Dict[Tuple[str, str, str], List[Passage]] = {}
+        for passage in by_chunk.values():
+            if passage.start is None:
+                merged.append(passage)
+            else:
+                by_source.setdefault((passage.source, passage.company, passage.year), []).append(passage)
+        for group in by_source.values():
+            group.sort(key=lambda passage: passage.start)
+            current = group[0]
+            for passage in group[1:]:
+                if passage.start > current.end + 1:
+                    merged.append(current)
+                    current = passage
+                    continue
+                # Offsets index the same source text, so the overlap is cut from the later passage.
+                if passage.end > current.end:
+                    separator = " " if passage.start > current.end else ""
+                    current.text += separator + passage.text[max(current.end - passage.start, 0):]
+                    current.end = passage.end
+                current.absorb(passage)
+            merged.append(current)
+
+        merged.sort(key=lambda passage: (passage.best_rank, -passage.score))
+        kept: List[Passage] = []
+        kept_shingles: List[set] = []
+        for passage in merged:
+            shingles = _shingles(passage.text)
+            duplicate_of = next((other for other, other_shingles in zip(kept, kept_shingles)
+                                 if len(shingles & other_shingles) >= self.duplicate_threshold * len(shingles)), None)
+            if duplicate_of is not None:
+                duplicate_of.absorb(passage)
+                continue
+            kept.append(passage)
+            kept_shingles.append(shingles)
+        return kept
+
+    def pack(self, sub_queries: Sequence[str], all_results: Sequence[Sequence[Tuple[Document, float]]],
+             token_budget: Optional[int] = None) -> Tuple[str, Dict[str, Any]]:
+        """Context text grouped by sub-query, and packing statistics"""
+        budget = token_budget or self.token_budget
+        passages = self.passages(all_results)
+        queues: List[List[Passage]] = [[] for _ in sub_queries]
+        for passage in passages:
+            for sub_query in passage.ranks:
+                queues[sub_query].append(passage)
+        for position, queue in enumerate(queues):
+            queue.sort(key=lambda passage: (passage.ranks[position], -passage.score))
+
+        headers = [f"--- Results for: {sub_query} ---" for sub_query in sub_queries]
+        chosen: List[List[str]] = [[] for _ in sub_queries]
+        placed: set = set()
+        served: set = set()
+        used = packed = truncated = 0
+        cursors = [0] * len(queues)
+        progress = True
+        while progress:
+            progress = False
+            for position, queue in enumerate(queues):
+                while cursors[position] < len(queue) and id(queue[cursors[position]]) in placed:
+                    cursors[position] += 1
+                if cursors[position] >= len(queue):
+                    continue
+                passage = queue[cursors[position]]
+                cursors[position] += 1
+                progress = True
+                text = passage.render()
+                header_tokens = 0 if chosen[position] else self.counter.count(headers[position]) + 1
+                tokens = self.counter.count(text) + 1
+                if used + header_tokens + tokens > budget:
+                    # A sub-query with nothing in the context yet gets its best passage cut to fit.
+                    remaining = budget - used - header_tokens - 1
+                    if position in served or remaining < self.min_passage_tokens:
+                        continue
+                    text = self._clip(text, remaining)
+                    if not text:
+                        continue
+                    tokens = self.counter.count(text) + 1
+                    truncated += 1
+                chosen[position].append(text)
+                placed.add(id(passage))
+                served.update(passage.ranks)
+                used += header_tokens + tokens
+                packed += 1
+
+        sections = [header + "\n" + "\n".join(texts) for header, texts in zip(headers, chosen) if texts]
+        stats = {
+            "hits": sum(len(results) for results in all_results),
+            "passages": len(passages),
+            "packed": packed,
+            "truncated": truncated,
+            "tokens": used,
+            "token_budget": budget,
+            "tokenizer": self.counter.backend,
+        }
+        return "\n\n".join(sections), stats
@@ -0,0 +1,209 @@
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+import json
+import mmap
+import numpy as np
+
+from .chunker import Document
+
+METADATA_FIELDS = ("company", "year", "source")
+_COPY_BLOCK = 1 << 24
+
+
+def _grow(column: np.ndarray, capacity: int, fill) -> np.ndarray:
+    grown = np.full((capacity,) + column.shape[1:], fill, dtype=column.dtype)
+    grown[:len(column)] = column
+    return grown
+
+
+class TextArena:
+    """Append-only UTF-8 string storage addressed by offsets.
+
+    Strings loaded from disk stay in a read-only memory map; strings appended afterwards go to
+    an in-memory tail, so a loaded arena costs no resident memory until strings are read.
+    """
+
+    def __init__(self, base: Optional[mmap.mmap] = None, offsets: Optional[np.ndarray] = None):
+        self._base = base
+        self._base_length = len(base) if base is not None else 0
+        self._tail = bytearray()
+        self._offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+        self._count = len(self._offsets) - 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, strings: List[str]):
+        needed = self._count + len(strings) + 1
+        if needed > len(self._offsets) or not self._offsets.flags.writeable:
+            self._offsets = _grow(self._offsets[:self._count + 1], max(needed, 2 * len(self._offsets)), 0)
+        end = int(self._offsets[self._count])
+        for i, string in enumerate(strings, start=self._count + 1):
+            encoded = string.encode("utf-8")
+            self._tail += encoded
+            end += len(encoded)
+            self._offsets[i] = end
+        self._count += len(strings)
+
+    def __getitem__(self, i: int) -> str:
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        if end <= self._base_length:
+            return self._base[start:end].decode("utf-8")
+        return self._tail[start - self._base_length:end - self._base_length].decode("utf-8")
+
+    def save(self, path: Path):
+        with open(path.with_suffix(".bin"), "wb") as f:
+            for start in range(0, self._base_length, _COPY_BLOCK):
+                f.write(self._base[start:start + _COPY_BLOCK])
+            f.write(self._tail)
+        np.save(path.with_suffix(".offsets.npy"), self._offsets[:self._count + 1])
+
+    @classmethod
+    def load(cls, path: Path) -> "TextArena":
+        offsets = np.load(path.with_suffix(".offsets.npy"), mmap_mode="r")
+        base = None
+        with open(path.with_suffix(".bin"), "rb") as f:
+            if int(offsets[-1]):
+                base = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(base, offsets)
+
+
+class DocumentStore:
+    """Columnar storage for chunks, indexed by slot.
+
+    Metadata is dictionary-encoded into int32 code columns (-1 marks a removed slot), page and
+    character offsets are integer columns, and chunk ids and text live in two text arenas.
+    `Document` objects are only built when a slot is read, e.g. for the top-k search hits.
+    """
+
+    def __init__(self):
+        self.vocab: Dict[str, List[str]] = {field: [] for field in METADATA_FIELDS}
+        self._code_of: Dict[str, Dict[str, int]] = {field: {} for field in METADATA_FIELDS}
+        self.codes: Dict[str, np.ndarray] = {field: np.empty(0, dtype=np.int32) for field in METADATA_FIELDS}
+        # page, start, end; -1 stands for None
+        self._positions = np.empty((0, 3), dtype=np.int64)
+        self._texts = TextArena()
+        self._chunk_ids = TextArena()
+        self._size = 0
+        self._live = 0
+        self._slot_by_chunk_id: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        """Number of slots, including removed ones"""
+        return self._size
+
+    @property
+    def live(self) -> int:
+        return self._live
+
+    def __getitem__(self, slot: int) -> Optional[Document]:
+        if not 0 <= slot < self._size or self.codes["company"][slot] < 0:
+            return None
+        page, start, end = (int(value) for value in self._positions[slot])
+        return Document(
+            content=self._texts[slot],
+            company=self.vocab["company"][self.codes["company"][slot]],
+            year=self.vocab["year"][self.codes["year"][slot]],
+            source=self.vocab["source"][self.codes["source"][slot]],
+            chunk_id=self._chunk_ids[slot],
+            page=page if page >= 0 else None,
+            start=start if start >= 0 else None,
+            end=end if end >= 0 else None,
+        )
+
+    def __iter__(self) -> Iterator[Optional[Document]]:
+        for slot in range(self._size):
+            yield self[slot]
+
+    def _slots(self) -> Dict[str, int]:
+        # Built on first use: a freshly loaded store that is only searched never decodes its chunk ids.
+        if self._slot_by_chunk_id is None:
+            self._slot_by_chunk_id = {self._chunk_ids[slot]: slot for slot in self.live_slots().tolist()}
+        return self._slot_by_chunk_id
+
+    def slot_of(self, chunk_id: str) -> Optional[int]:
+        return self._slots().get(chunk_id)
+
+    def live_slots(self) -> np.ndarray:
+        return np.flatnonzero(self.codes["company"][:self._size] >= 0)
+
+    def code_of(self, field: str, value: str) -> Optional[int]:
+        return self._code_of[field].get(value)
+
+    def slots_where(self, field: str, value: str) -> np.ndarray:
+        code = self.code_of(field, value)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(self.codes[field][:self._size] == code)
+
+    def add(self, documents: List[Document]) -> int:
+        """Append documents to new slots; returns the first slot"""
+        start, count = self._size, len(documents)
+        capacity = max(self._size + count, 2 * len(self._positions), 1024)
+        if self._size + count > len(self._positions) or not self._positions.flags.writeable:
+            self._positions = _grow(self._positions[:self._size], capacity, -1)
+            for field in METADATA_FIELDS:
+                self.codes[field] = _grow(self.codes[field][:self._size], capacity, -1)
+
+        for field in METADATA_FIELDS:
+            code_of, values = self._code_of[field], self.vocab[field]
+            codes = []
+            for doc in documents:
+                value = getattr(doc, field)
+                code = code_of.get(value)
+                if code is None:
+                    code = code_of[value] = len(values)
+                    values.append(value)
+                codes.append(code)
+            self.codes[field][start:start + count] = codes
+        self._positions[start:start + count] = [
+            [-1 if value is None else value for value in (doc.page, doc.start, doc.end)] for doc in documents
+        ]
+        self._texts.append([doc.content for doc in documents])
+        self._chunk_ids.append([doc.chunk_id for doc in documents])
+
+        slots = self._slots()
+        for slot, doc in enumerate(documents, start=start):
+            slots[doc.chunk_id] = slot
+        self._size += count
+        self._live += count
+        return start
+
+    def remove(self, slots: List[int]):
+        if not slots:
+            return
+        for column in self.codes.values():
+            if not column.flags.writeable:
+                self.codes = {field: np.array(codes) for field, codes in self.codes.items()}
+                break
+        by_chunk_id = self._slots()
+        for slot in slots:
+            by_chunk_id.pop(self._chunk_ids[slot], None)
+        ids = np.asarray(slots, dtype=np.int64)
+        for column in self.codes.values():
+            column[ids] = -1
+        self._live -= len(slots)
+
+    def save(self, directory: Path):
+        for field in METADATA_FIELDS:
+            np.save(directory / f"docs_{field}.npy", self.codes[field][:self._size])
+        np.save(directory / "docs_positions.npy", self._positions[:self._size])
+        with open(directory / "docs_vocab.json", "w", encoding="utf-8") as f:
+            json.dump(self.vocab, f)
+        self._texts.save(directory / "docs_text")
+        self._chunk_ids.save(directory / "docs_chunk_ids")
+
+    @classmethod
+    def load(cls, directory: Path) -> "DocumentStore":
+        store = cls()
+        with open(directory / "docs_vocab.json", "r", encoding="utf-8") as f:
+            store.vocab = json.load(f)
+        store._code_of = {field: {value: code for code, value in enumerate(values)}
+                          for field, values in store.vocab.items()}
+        store.codes = {field: np.load(directory / f"docs_{field}.npy", mmap_mode="r") for field in METADATA_FIELDS}
+        store._positions = np.load(directory / "docs_positions.npy", mmap_mode="r")
+        store._texts = TextArena.load(directory / "docs_text")
+        store._chunk_ids = TextArena.load(directory / "docs_chunk_ids")
+        store._size = len(store._positions)
+        store._live = int(np.count_nonzero(store.codes["company"] >= 0))
+        return store
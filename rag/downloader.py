@@ -0,0 +1,107 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict
+import json
+import os
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .batch import RETRY_STATUSES, TokenBucket, _backoff_delay
+
+
+@dataclass
+class DownloadResult:
+    path: Path
+    status: str  # "downloaded" or "not_modified"
+    bytes_written: int = 0
+
+
+class FilingDownloader:
+    """Pooled, rate-limited HTTP client with conditional GETs and streaming writes to disk"""
+
+    def __init__(self, user_agent: str, max_workers: int = 8, requests_per_second: float = 10.0,
+                 timeout: float = 30.0, chunk_size: int = 1 << 16, max_retries: int = 3,
+                 backoff_factor: float = 0.5, max_backoff: float = 30.0):
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': user_agent})
+        adapter = HTTPAdapter(
+            pool_connections=max_workers,
+            pool_maxsize=max_workers,
+            # Retries inside urllib3 would skip the rate limiter, so get() does them itself.
+            max_retries=Retry(total=0),
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # One bucket shared by every worker thread keeps the whole process under the
+        # EDGAR fair-access limit (10 requests/second).
+        self.rate_limiter = TokenBucket(requests_per_second, requests_per_second)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """GET url, retrying connection errors and RETRY_STATUSES responses with backoff.
+
+        Every attempt takes a token from the shared bucket, so retries count against the rate
+        limit too. The last response is returned as is once retries run out.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            retry_after = ""
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    return response
+                retry_after = response.headers.get("Retry-After", "")
+                response.close()
+            delay = (min(float(retry_after), self.max_backoff) if retry_after.isdigit()
+                     else _backoff_delay(attempt, self.backoff_factor, self.max_backoff))
+            time.sleep(delay)
+
+    @staticmethod
+    def meta_path(path: Path) -> Path:
+        return path.with_name(path.name + ".meta.json")
+
+    def download(self, url: str, path: Path) -> DownloadResult:
+        """Stream url to path, skipping the transfer if the server reports it unchanged"""
+        meta_path = self.meta_path(path)
+        headers: Dict[str, str] = {}
+        if path.exists() and meta_path.exists():
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta: Dict[str, Any] = json.load(f)
+            if meta.get('url') == url:
+                if meta.get('etag'):
+                    headers['If-None-Match'] = meta['etag']
+                if meta.get('last_modified'):
+                    headers['If-Modified-Since'] = meta['last_modified']
+
+        with self.get(url, headers=headers, stream=True) as response:
+            if response.status_code == 304:
+                return DownloadResult(path, "not_modified")
+            response.raise_for_status()
+            tmp_path = path.with_name(path.name + f".part-{os.getpid()}")
+            written = 0
+            with open(tmp_path, 'wb') as f:
+                for block in response.iter_content(chunk_size=self.chunk_size):
+                    f.write(block)
+                    written += len(block)
+            os.replace(tmp_path, path)
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'url': url,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                }, f)
+        return DownloadResult(path, "downloaded", written)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,166 @@
+from pathlib import Path
+from typing import Callable, Dict, List
+import hashlib
+import json
+import os
+import re
+import numpy as np
+
+KEY_DTYPE = np.dtype("V16")
+
+
+class EmbeddingCache:
+    """Disk-backed embedding cache keyed by (model name, hash of chunk text)"""
+
+    def __init__(self, cache_dir: str, model_name: str, max_entries: int = 200_000):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.path = Path(cache_dir) / re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        self.hits = 0
+        self.misses = 0
+
+        self._keys = np.empty(0, dtype=KEY_DTYPE)
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._last_used = np.empty(0, dtype=np.int64)
+        self._size = 0
+        self._row_by_key: Dict[bytes, int] = {}
+        self._clock = 0
+        self._dirty = False
+        self._load()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _key(self, text: str) -> bytes:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self.model_name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8"))
+        return digest.digest()
+
+    def encode(self, texts: List[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Return embeddings for texts, calling encode_fn only for cache misses"""
+        keys = [self._key(text) for text in texts]
+        rows = [self._row_by_key.get(key, -1) for key in keys]
+        missing = [i for i, row in enumerate(rows) if row < 0]
+
+        # Several identical chunks in one batch only need one encoder pass.
+        unique_missing: Dict[bytes, int] = {}
+        for i in missing:
+            unique_missing.setdefault(keys[i], i)
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        fresh = None
+        if unique_missing:
+            fresh = np.asarray(encode_fn([texts[i] for i in unique_missing.values()]), dtype=np.float32)
+            if fresh.ndim == 1:
+                fresh = fresh.reshape(1, -1)
+            fresh_row = {key: j for j, key in enumerate(unique_missing)}
+
+        dimension = fresh.shape[1] if fresh is not None else self._vectors.shape[1]
+        out = np.empty((len(texts), dimension), dtype=np.float32)
+        hit_positions = [i for i, row in enumerate(rows) if row >= 0]
+        if hit_positions:
+            hit_rows = np.asarray([rows[i] for i in hit_positions], dtype=np.int64)
+            out[hit_positions] = self._vectors[hit_rows]
+            self._clock += 1
+            self._last_used[hit_rows] = self._clock
+        if fresh is not None:
+            out[missing] = fresh[[fresh_row[keys[i]] for i in missing]]
+            self._put(list(unique_missing), fresh)
+        return out
+
+    def _put(self, keys: List[bytes], vectors: np.ndarray):
+        count, dimension = vectors.shape
+        if self._size and self._vectors.shape[1] != dimension:
+            raise ValueError(f"Embedding dimension changed from {self._vectors.shape[1]} to {dimension}")
+        needed = self._size + count
+        if needed > self._keys.shape[0]:
+            capacity = max(needed, 2 * self._keys.shape[0], 1024)
+            self._keys = _grow(self._keys, capacity, self._size)
+            self._last_used = _grow(self._last_used, capacity, self._size)
+            vectors_buffer = np.empty((capacity, dimension), dtype=np.float32)
+            if self._size:
+                vectors_buffer[:self._size] = self._vectors[:self._size]
+            self._vectors = vectors_buffer
+
+        start = self._size
+        self._clock += 1
+        self._keys[start:needed] = np.frombuffer(b"".join(keys), dtype=KEY_DTYPE)
+        self._vectors[start:needed] = vectors
+        self._last_used[start:needed] = self._clock
+        for offset, key in enumerate(keys):
+            self._row_by_key[key] = start + offset
+        self._size = needed
+        self._dirty = True
+
+        if self._size > self.max_entries:
+            self._evict(int(self.max_entries * 0.9))
+
+    def _evict(self, keep: int):
+        """Drop least recently used entries so that `keep` remain"""
+        order = np.argsort(self._last_used[:self._size], kind="stable")[self._size - keep:]
+        order.sort()
+        self._keys = self._keys[order].copy()
+        self._vectors = self._vectors[order].copy()
+        self._last_used = self._last_used[order].copy()
+        self._size = keep
+        self._row_by_key = {key.tobytes(): row for row, key in enumerate(self._keys)}
+        self._dirty = True
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": self._size,
+        }
+
+    def save(self):
+        if not self._dirty:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        arrays = {
+            "keys": self._keys[:self._size],
+            "vectors": self._vectors[:self._size],
+            "last_used": self._last_used[:self._size],
+        }
+        for name, array in arrays.items():
+            tmp = self.path / f"{name}.tmp.npy"
+            np.save(tmp, array)
+            os.replace(tmp, self.path / f"{name}.npy")
+        with open(self.path / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({"model_name": self.model_name, "entries": self._size, "clock": self._clock}, f)
+        self._dirty = False
+
+    def _load(self):
+        meta_path = self.path / "meta.json"
+        if not meta_path.exists():
+            return
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("model_name") != self.model_name:
+                return
+            keys = np.load(self.path / "keys.npy")
+            vectors = np.load(self.path / "vectors.npy")
+            last_used = np.load(self.path / "last_used.npy")
+            if not (len(keys) == len(vectors) == len(last_used) == meta["entries"]):
+                print(f"Embedding cache at {self.path} is inconsistent, starting empty")
+                return
+        except Exception as e:
+            print(f"Error loading embedding cache {self.path}: {e}")
+            return
+        self._keys, self._vectors, self._last_used = keys, vectors, last_used
+        self._size = len(keys)
+        self._clock = int(meta.get("clock", 0))
+        self._row_by_key = {key.tobytes(): row for row, key in enumerate(keys)}
+
+
+def _grow(array: np.ndarray, capacity: int, size: int) -> np.ndarray:
+    grown = np.empty(capacity, dtype=array.dtype)
+    grown[:size] = array[:size]
+    return grown
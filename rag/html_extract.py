@@ -0,0 +1,190 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from typing import Dict, Iterator, List, Optional, Tuple
+import codecs
+import mmap
+import os
+import re
+
+# Subtrees whose text never reaches the index.
+SKIP_TAGS = {"script", "style", "noscript", "template", "head", "ix:header"}
+# Tags that end the current text block.
+BLOCK_TAGS = {
+    "p", "div", "br", "li", "ul", "ol", "section", "article", "hr", "title",
+    "h1", "h2", "h3", "h4", "h5", "h6", "table", "center", "blockquote", "pre",
+}
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+VOID_TAGS = {"br", "hr", "img", "meta", "link", "input", "col", "area", "base", "wbr"}
+# Tags whose end tag HTML lets authors omit; they are not tracked as enclosing elements.
+OPTIONAL_END_TAGS = {"p", "li", "dt", "dd", "tr", "td", "th", "option", "thead", "tbody", "tfoot"}
+_HIDDEN_STYLE = re.compile(r"display\s*:\s*none", re.IGNORECASE)
+_SECTION_RE = re.compile(r"^(part\s+[ivx]+|item\s+\d+[a-z]?)\b[.:]?", re.IGNORECASE)
+
+
+@dataclass
+class TextBlock:
+    kind: str  # "text", "heading", "section" or "table"
+    text: str
+
+
+class _FilingParser(HTMLParser):
+    """Event-based parser that turns filing HTML into text blocks as it is fed"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: List[TextBlock] = []
+        self._parts: List[str] = []
+        self._skip_tag: Optional[str] = None
+        self._skip_depth = 0
+        # Open elements outside skipped subtrees; a skipped element that is never closed ends
+        # when an element enclosing it does.
+        self._open: List[str] = []
+        self._heading_depth = 0
+        self._table_depth = 0
+        self._rows: List[str] = []
+        self._cells: List[str] = []
+
+    def _flush_text(self, kind: str = "text"):
+        text = " ".join("".join(self._parts).split())
+        self._parts.clear()
+        if not text:
+            return
+        if kind == "text" and _SECTION_RE.match(text):
+            kind = "section"
+        self.blocks.append(TextBlock(kind, text))
+
+    def _flush_cell(self):
+        cell = " ".join("".join(self._parts).split())
+        self._parts.clear()
+        if cell:
+            self._cells.append(cell)
+
+    def _flush_row(self):
+        self._flush_cell()
+        if self._cells:
+            self._rows.append(" | ".join(self._cells))
+            self._cells.clear()
+
+    def _end_skip(self):
+        self._skip_tag, self._skip_depth = None, 0
+
+    def handle_starttag(self, tag, attrs):
+        if self._skip_tag is not None:
+            if tag != "body":
+                if tag == self._skip_tag:
+                    self._skip_depth += 1
+                return
+            # Skipped content never runs into the body, e.g. from an unclosed <head>.
+            self._end_skip()
+        style = next((value for name, value in attrs if name == "style" and value), None)
+        if tag in SKIP_TAGS or (style and _HIDDEN_STYLE.search(style) and tag not in VOID_TAGS):
+            self._skip_tag, self._skip_depth = tag, 1
+            return
+        if tag not in VOID_TAGS and tag not in OPTIONAL_END_TAGS:
+            self._open.append(tag)
+        if tag == "table":
+            self._flush_text()
+            self._table_depth += 1
+        elif self._table_depth:
+            if tag == "tr":
+                self._flush_row()
+            elif tag in ("td", "th"):
+                self._flush_cell()
+        elif tag in HEADING_TAGS:
+            self._flush_text()
+            self._heading_depth += 1
+        elif tag in BLOCK_TAGS:
+            self._flush_text("heading" if self._heading_depth else "text")
+
+    def handle_startendtag(self, tag, attrs):
+        if self._skip_tag is None and tag in BLOCK_TAGS and not self._table_depth:
+            self._flush_text("heading" if self._heading_depth else "text")
+
+    def handle_endtag(self, tag):
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth -= 1
+                if self._skip_depth == 0:
+                    self._skip_tag = None
+                return
+            if tag not in self._open:
+                return
+            # An enclosing element closed, so the skipped one was never closed.
+            self._end_skip()
+        if tag in self._open:
+            del self._open[len(self._open) - 1 - self._open[::-1].index(tag):]
+        if tag == "table" and self._table_depth:
+            self._table_depth -= 1
+            if self._table_depth == 0:
+                self._flush_row()
+                if self._rows:
+                    self.blocks.append(TextBlock("table", "\n".join(self._rows)))
+                    self._rows.clear()
+        elif self._table_depth:
+            if tag in ("td", "th"):
+                self._flush_cell()
+            elif tag == "tr":
+                self._flush_row()
+        elif tag in HEADING_TAGS:
+            self._flush_text("heading")
+            self._heading_depth = max(0, self._heading_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self._flush_text("heading" if self._heading_depth else "text")
+
+    def handle_data(self, data):
+        if self._skip_tag is None:
+            self._parts.append(data)
+
+    def finish(self):
+        self.close()
+        if self._table_depth:
+            self._flush_row()
+            if self._rows:
+                self.blocks.append(TextBlock("table", "\n".join(self._rows)))
+                self._rows.clear()
+        self._flush_text()
+
+
+def iter_text_blocks(filepath: str, read_size: int = 1 << 20) -> Iterator[TextBlock]:
+    """Yield text blocks from an HTML filing without loading or parsing it as a whole.
+
+    The file is memory-mapped and fed to an event-based parser in `read_size` slices;
+    scripts, styles, hidden elements and the inline-XBRL header are dropped on the fly.
+    """
+    parser = _FilingParser()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    with open(filepath, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for offset in range(0, size, read_size):
+                    parser.feed(decoder.decode(mapped[offset:offset + read_size]))
+                    if parser.blocks:
+                        yield from parser.blocks
+                        parser.blocks.clear()
+    parser.feed(decoder.decode(b"", final=True))
+    parser.finish()
+    yield from parser.blocks
+
+
+def extract_text(filepath: str) -> str:
+    """Plain text of a filing, one block per line"""
+    return "\n".join(block.text for block in iter_text_blocks(filepath))
+
+
+def _extract_one(filepath: str) -> Tuple[str, str]:
+    try:
+        return filepath, extract_text(filepath)
+    except Exception as e:
+        print(f"Error extracting text from {filepath}: {e}")
+        return filepath, ""
+
+
+def extract_many(filepaths: List[str], processes: Optional[int] = None) -> Dict[str, str]:
+    """Extract many filings in parallel worker processes; returns {filepath: text}"""
+    processes = min(processes or os.cpu_count() or 1, len(filepaths))
+    if processes <= 1:
+        return dict(_extract_one(path) for path in filepaths)
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return dict(pool.map(_extract_one, filepaths))
@@ -0,0 +1,229 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import math
+import time
+import numpy as np
+
+from .lazy_import import LazyModule
+
+faiss = LazyModule("faiss")
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+# How the index stores vectors: full precision, fp16 or 8-bit scalar quantized, or PQ codes
+STORAGE_TYPES = ("float32", "float16", "int8", "pq")
+_SQ_CODES = {"float32": "Flat", "float16": "SQfp16", "int8": "SQ8"}
+
+
+@dataclass
+class IndexConfig:
+    """Approximate-nearest-neighbour index settings for VectorStore"""
+    index_type: str = "flat"
+    # Corpora smaller than this stay on an exact flat index.
+    min_corpus_size: int = 10_000
+    train_sample: int = 100_000
+    nlist: Optional[int] = None
+    nprobe: int = 16
+    hnsw_m: int = 32
+    ef_construction: int = 80
+    ef_search: int = 64
+    pq_m: int = 16
+    pq_nbits: int = 8
+    recall_k: int = 10
+    recall_queries: int = 200
+    storage: str = "float32"
+    # Compressed indexes fetch k * rescore_factor candidates and re-rank them with the full vectors.
+    rescore_factor: int = 4
+    # Filtered searches on IVF/HNSW matching at most this many chunks scan their full vectors
+    # exactly; graph and inverted-list traversal can miss chunks of a selective filter.
+    exact_filter_limit: int = 16_384
+
+    def __post_init__(self):
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type {self.index_type!r}, expected one of {INDEX_TYPES}")
+        if self.storage not in STORAGE_TYPES:
+            raise ValueError(f"Unknown storage {self.storage!r}, expected one of {STORAGE_TYPES}")
+
+    def effective_type(self, corpus_size: int) -> str:
+        return self.index_type if corpus_size >= self.min_corpus_size else "flat"
+
+    def effective_storage(self, corpus_size: int) -> str:
+        # Quantizers need training data, so small corpora keep exact float32 vectors too.
+        return self.storage if corpus_size >= self.min_corpus_size else "float32"
+
+    def nlist_for(self, corpus_size: int) -> int:
+        if self.nlist:
+            return self.nlist
+        # ~4*sqrt(n) lists, but keep at least 39 training points per centroid.
+        return max(1, min(int(4 * math.sqrt(corpus_size)), corpus_size // 39))
+
+    def pq_m_for(self, dimension: int) -> int:
+        m = min(self.pq_m, dimension)
+        while dimension % m:
+            m -= 1
+        return m
+
+
+def is_compressed(index_type: str, storage: str) -> bool:
+    return index_type == "ivf_pq" or storage != "float32"
+
+
+def factory_string(config: IndexConfig, index_type: str, dimension: int, corpus_size: int,
+                   storage: str = "float32") -> str:
+    pq = f"PQ{config.pq_m_for(dimension)}x{config.pq_nbits}"
+    codes = pq if storage == "pq" else _SQ_CODES[storage]
+    if index_type == "flat":
+        # IndexPQ supports no id selectors; a single inverted list scans the same codes and does.
+        return f"IVF1,{pq}" if storage == "pq" else codes
+    if index_type == "hnsw":
+        return f"HNSW{config.hnsw_m},{codes}"
+    nlist = config.nlist_for(corpus_size)
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},{codes}"
+    return f"IVF{nlist},{pq}"
+
+
+def build_index(config: IndexConfig, index_type: str, dimension: int, corpus_size: int,
+                storage: str = "float32") -> "faiss.Index":
+    """Create an empty inner-product index of the given type and vector storage that takes external ids"""
+    factory = factory_string(config, index_type, dimension, corpus_size, storage)
+    inner = faiss.index_factory(dimension, factory, faiss.METRIC_INNER_PRODUCT)
+    if index_type == "hnsw":
+        faiss.downcast_index(inner).hnsw.efConstruction = config.ef_construction
+    if factory.startswith("IVF"):
+        # Inverted lists (flat PQ storage is a single one) store ids natively. Under an IDMap2,
+        # remove_ids would compact the id map while the lists keep their old internal ids,
+        # shifting every later hit by one document.
+        return inner
+    return faiss.IndexIDMap2(inner)
+
+
+def train_index(index: "faiss.Index", config: IndexConfig, vectors: np.ndarray, seed: int = 0):
+    if index.is_trained:
+        return
+    sample_size = min(config.train_sample, vectors.shape[0])
+    rows = np.random.default_rng(seed).choice(vectors.shape[0], sample_size, replace=False)
+    rows.sort()
+    index.train(np.ascontiguousarray(vectors[rows], dtype=np.float32))
+
+
+def supports_removal(index_type: str) -> bool:
+    return index_type != "hnsw"
+
+
+def search_parameters(config: IndexConfig, index_type: str, selector=None,
+                      nprobe: Optional[int] = None, ef_search: Optional[int] = None, storage: str = "float32"):
+    """Per-call FAISS search parameters, so nprobe/efSearch never mutate the shared index"""
+    if index_type in ("ivf_flat", "ivf_pq"):
+        params = faiss.SearchParametersIVF()
+        params.nprobe = nprobe or config.nprobe
+    elif index_type == "hnsw":
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = ef_search or config.ef_search
+    elif selector is None:
+        return None
+    elif storage == "pq":
+        params = faiss.SearchParametersIVF()
+        params.nprobe = 1
+    else:
+        params = faiss.SearchParameters()
+    if selector is not None:
+        params.sel = selector
+    return params
+
+
+def rescore(queries: np.ndarray, candidates: np.ndarray, vectors: np.ndarray, k: int,
+            rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Re-rank candidate ids by exact inner product with full-precision vectors.
+
+    Returns (scores, ids) shaped like `index.search` output, padded with -1 ids. Candidate ids
+    index `vectors` directly, or are looked up in the sorted id array `rows` when given.
+    """
+    scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    ids = np.full((len(queries), k), -1, dtype=np.int64)
+    for i, (query, row_candidates) in enumerate(zip(queries, candidates)):
+        row_candidates = np.sort(row_candidates[row_candidates >= 0])
+        if not len(row_candidates):
+            continue
+        # Sorted positions turn the gather from a disk-backed array into a forward scan.
+        positions = row_candidates if rows is None else np.searchsorted(rows, row_candidates)
+        exact = np.asarray(vectors[positions], dtype=np.float32) @ query
+        top = np.argsort(-exact, kind="stable")[:k]
+        scores[i, :len(top)] = exact[top]
+        ids[i, :len(top)] = row_candidates[top]
+    return scores, ids
+
+
+def recall_report(index: "faiss.Index", config: IndexConfig, index_type: str, vectors: np.ndarray,
+                  ids: np.ndarray, queries: Optional[np.ndarray] = None, seed: int = 0,
+                  storage: str = "float32") -> Dict[str, Any]:
+    """Measure recall@k and latency of `index` against an exact flat index over the same vectors.
+
+    Sweeps nprobe (IVF) or efSearch (HNSW) so settings can be picked from measured trade-offs.
+    For compressed storage, recall after exact re-scoring of k * rescore_factor candidates is
+    reported as well. Queries default to a sample of the indexed vectors.
+    """
+    k = min(config.recall_k, len(ids))
+    if queries is None:
+        rows = np.random.default_rng(seed).choice(vectors.shape[0], min(config.recall_queries, vectors.shape[0]),
+                                                  replace=False)
+        queries = vectors[rows]
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+
+    exact = faiss.IndexIDMap2(faiss.IndexFlatIP(vectors.shape[1]))
+    exact.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), ids)
+    started = time.perf_counter()
+    _, truth = exact.search(queries, k)
+    flat_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+    if index_type in ("ivf_flat", "ivf_pq"):
+        nlist = faiss.extract_index_ivf(index).nlist
+        sweep = [("nprobe", value) for value in (1, 2, 4, 8, 16, 32, 64, 128) if value <= nlist]
+    elif index_type == "hnsw":
+        sweep = [("ef_search", value) for value in (16, 32, 64, 128, 256)]
+    else:
+        sweep = [("exact", 0)]
+
+    def recall(found: np.ndarray) -> float:
+        hits = sum(len(np.intersect1d(found_row, truth_row)) for found_row, truth_row in zip(found, truth))
+        return hits / (k * len(queries))
+
+    compressed = is_compressed(index_type, storage)
+    settings: List[Dict[str, Any]] = []
+    for name, value in sweep:
+        params = search_parameters(config, index_type, nprobe=value if name == "nprobe" else None,
+                                   ef_search=value if name == "ef_search" else None)
+        started = time.perf_counter()
+        _, found = index.search(queries, k, params=params)
+        elapsed_ms = (time.perf_counter() - started) * 1000 / len(queries)
+        row = {name: value, "recall_at_k": recall(found), "ms_per_query": elapsed_ms}
+        if compressed:
+            started = time.perf_counter()
+            _, candidates = index.search(queries, min(k * config.rescore_factor, len(ids)), params=params)
+            _, found = rescore(queries, candidates, vectors, k, rows=ids)
+            row["rescored_recall_at_k"] = recall(found)
+            row["rescored_ms_per_query"] = (time.perf_counter() - started) * 1000 / len(queries)
+        settings.append(row)
+
+    return {
+        "index_type": index_type,
+        "storage": storage,
+        "corpus_size": int(len(ids)),
+        "k": k,
+        "num_queries": int(len(queries)),
+        "flat_ms_per_query": flat_ms,
+        "settings": settings,
+    }
+
+
+def format_recall_report(report: Dict[str, Any]) -> str:
+    lines = [f"Recall@{report['k']} for {report['index_type']} ({report.get('storage', 'float32')}) over "
+             f"{report['corpus_size']} vectors (flat baseline {report['flat_ms_per_query']:.3f} ms/query):"]
+    for row in report["settings"]:
+        setting = ", ".join(f"{key}={value}" for key, value in row.items()
+                            if "recall" not in key and "ms_per_query" not in key)
+        line = f"  {setting}: recall={row['recall_at_k']:.3f}, {row['ms_per_query']:.3f} ms/query"
+        if "rescored_recall_at_k" in row:
+            line += (f"; re-scored recall={row['rescored_recall_at_k']:.3f}, "
+                     f"{row['rescored_ms_per_query']:.3f} ms/query")
+        lines.append(line)
+    return "\n".join(lines)
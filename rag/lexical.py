@@ -0,0 +1,156 @@
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import math
+import re
+import numpy as np
+
+# Keeps tokens such as "r&d", "10-k" and "47.5" intact.
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[&.'\-][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """In-process BM25 inverted index over document slots.
+
+    Postings are appended per ingestion batch as (slot, term frequency) arrays and
+    concatenated lazily the first time a term is queried, so adding documents never
+    touches postings of unrelated terms and queries only read postings of their own terms.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, List[Tuple[np.ndarray, np.ndarray]]] = {}
+        self._doc_len = np.zeros(0, dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._total_len = 0.0
+        self._num_alive = 0
+
+    def __len__(self) -> int:
+        return self._num_alive
+
+    def _reserve(self, size: int):
+        if size <= self._doc_len.shape[0]:
+            return
+        capacity = max(size, 2 * self._doc_len.shape[0], 1024)
+        doc_len = np.zeros(capacity, dtype=np.float32)
+        doc_len[:self._doc_len.shape[0]] = self._doc_len
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._alive.shape[0]] = self._alive
+        self._doc_len, self._alive = doc_len, alive
+
+    def add(self, slots: List[int], texts: List[str]):
+        if not slots:
+            return
+        self._reserve(max(slots) + 1)
+        batch: Dict[str, Tuple[List[int], List[int]]] = {}
+        for slot, text in zip(slots, texts):
+            counts = Counter(tokenize(text))
+            for term, tf in counts.items():
+                ids, tfs = batch.setdefault(term, ([], []))
+                ids.append(slot)
+                tfs.append(tf)
+            length = sum(counts.values())
+            self._doc_len[slot] = length
+            self._alive[slot] = True
+            self._total_len += length
+            self._num_alive += 1
+        for term, (ids, tfs) in batch.items():
+            self._postings.setdefault(term, []).append(
+                (np.asarray(ids, dtype=np.int64), np.asarray(tfs, dtype=np.float32)))
+
+    def remove(self, slots: List[int]):
+        for slot in slots:
+            if slot < self._alive.shape[0] and self._alive[slot]:
+                self._alive[slot] = False
+                self._total_len -= float(self._doc_len[slot])
+                self._num_alive -= 1
+
+    def _term_postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        chunks = self._postings.get(term)
+        if not chunks:
+            return None
+        if len(chunks) > 1:
+            chunks[:] = [(np.concatenate([ids for ids, _ in chunks]), np.concatenate([tfs for _, tfs in chunks]))]
+        return chunks[0]
+
+    def search(self, query: str, k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (slots, scores) for query, optionally restricted to slots where mask is True"""
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        if self._num_alive == 0:
+            return empty
+        avg_len = self._total_len / self._num_alive
+
+        slot_parts: List[np.ndarray] = []
+        score_parts: List[np.ndarray] = []
+        for term in set(tokenize(query)):
+            postings = self._term_postings(term)
+            if postings is None:
+                continue
+            ids, tfs = postings
+            alive = self._alive[ids]
+            df = int(alive.sum())
+            if df == 0:
+                continue
+            keep = alive if mask is None else alive & mask[ids]
+            ids, tfs = ids[keep], tfs[keep]
+            if ids.size == 0:
+                continue
+            idf = math.log(1.0 + (self._num_alive - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self._doc_len[ids] / avg_len)
+            slot_parts.append(ids)
+            score_parts.append(idf * tfs * (self.k1 + 1.0) / (tfs + norm))
+        if not slot_parts:
+            return empty
+
+        # Accumulate only over candidate slots, so cost follows posting lengths, not corpus size.
+        slots, inverse = np.unique(np.concatenate(slot_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts)).astype(np.float32)
+        if scores.size > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(scores.size)
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return slots[top], scores[top]
+
+    def to_arrays(self) -> Dict[str, object]:
+        """Flatten postings into CSR-style arrays (plus the term list) for snapshots"""
+        terms = list(self._postings)
+        postings = [self._term_postings(term) for term in terms]
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([ids.size for ids, _ in postings])
+        return {
+            "terms": terms,
+            "offsets": offsets,
+            "ids": np.concatenate([ids for ids, _ in postings]) if postings else np.empty(0, dtype=np.int64),
+            "tfs": np.concatenate([tfs for _, tfs in postings]) if postings else np.empty(0, dtype=np.float32),
+            "doc_len": self._doc_len,
+            "alive": self._alive,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, object], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        index = cls(k1=k1, b=b)
+        offsets, ids, tfs = arrays["offsets"], arrays["ids"], arrays["tfs"]
+        for i, term in enumerate(arrays["terms"]):
+            start, end = offsets[i], offsets[i + 1]
+            index._postings[term] = [(ids[start:end], tfs[start:end])]
+        index._doc_len = np.array(arrays["doc_len"], dtype=np.float32)
+        index._alive = np.array(arrays["alive"], dtype=bool)
+        index._num_alive = int(index._alive.sum())
+        index._total_len = float(index._doc_len[index._alive].sum())
+        return index
+
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], k: int, rrf_k: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+    """Fuse ranked slot lists into top-k (slots, fused scores)"""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, slot in enumerate(ranking.tolist()):
+            fused[slot] = fused.get(slot, 0.0) + 1.0 / (rrf_k + rank + 1)
+    ordered = sorted(fused.items(), key=lambda item: -item[1])[:k]
+    return (np.asarray([slot for slot, _ in ordered], dtype=np.int64),
+            np.asarray([score for _, score in ordered], dtype=np.float32))
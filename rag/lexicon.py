@@ -0,0 +1,183 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+import re
+
+
+@dataclass(frozen=True)
+class Metric:
+    """A financial metric: reported XBRL concepts, or a ratio/difference of other metrics"""
+    name: str
+    label: str
+    aliases: Tuple[str, ...]
+    # Alternative us-gaap concepts for the same figure; the first one a company reports wins.
+    concepts: Tuple[str, ...] = ()
+    # Computed as numerator / denominator metric names (ratios are fractions, shown as percentages).
+    ratio: Optional[Tuple[str, str]] = None
+    # Fallback when none of `concepts` is reported, e.g. gross profit = revenue - cost of revenue.
+    difference: Optional[Tuple[str, str]] = None
+    unit: str = "USD"
+
+    @property
+    def is_ratio(self) -> bool:
+        return self.ratio is not None
+
+
+COMPANIES: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "MSFT": ("Microsoft", ("microsoft", "msft", "microsoft corporation")),
+    "GOOGL": ("Alphabet (Google)", ("google", "alphabet", "googl", "goog", "alphabet inc")),
+    "NVDA": ("NVIDIA", ("nvidia", "nvda", "nvidia corporation")),
+}
+
+# Phrases that stand for every company in the corpus.
+ALL_COMPANIES = ("all three", "three companies", "all companies", "across companies", "each company",
+                 "every company", "all of them")
+
+METRICS: Dict[str, Metric] = {metric.name: metric for metric in (
+    Metric("revenue", "total revenue",
+           ("total revenue", "total revenues", "revenue", "revenues", "net sales", "sales", "top line"),
+           concepts=("Revenues", "RevenueFromContractWithCustomerExcludingAssessedTax", "SalesRevenueNet")),
+    Metric("cost_of_revenue", "cost of revenue", ("cost of revenue", "cost of revenues", "cost of sales"),
+           concepts=("CostOfRevenue", "CostOfGoodsAndServicesSold")),
+    Metric("gross_profit", "gross profit", ("gross profit",), concepts=("GrossProfit",),
+           difference=("revenue", "cost_of_revenue")),
+    Metric("operating_income", "operating income", ("operating income", "operating profit", "income from operations"),
+           concepts=("OperatingIncomeLoss",)),
+    Metric("net_income", "net income", ("net income", "net earnings", "net profit"), concepts=("NetIncomeLoss",)),
+    Metric("rd_expense", "R&D expense",
+           ("r&d", "r&d spending", "r&d expense", "r&d expenses", "research and development",
+            "research and development expense", "research and development expenses"),
+           concepts=("ResearchAndDevelopmentExpense",)),
+    Metric("eps_diluted", "diluted EPS", ("diluted eps", "diluted earnings per share", "earnings per share", "eps"),
+           concepts=("EarningsPerShareDiluted",), unit="USD/shares"),
+    Metric("total_assets", "total assets", ("total assets", "assets"), concepts=("Assets",)),
+    Metric("cash", "cash and cash equivalents", ("cash and cash equivalents", "cash"),
+           concepts=("CashAndCashEquivalentsAtCarryingValue",)),
+    Metric("gross_margin", "gross margin", ("gross margin", "gross margins"), ratio=("gross_profit", "revenue")),
+    Metric("operating_margin", "operating margin", ("operating margin", "operating margins"),
+           ratio=("operating_income", "revenue")),
+    Metric("net_margin", "net margin", ("net margin", "net profit margin", "profit margin"),
+           ratio=("net_income", "revenue")),
+    Metric("rd_intensity", "R&D as a percentage of revenue", ("r&d intensity", "r&d as a percentage of revenue"),
+           ratio=("rd_expense", "revenue")),
+)}
+
+# Business lines (and figures the metrics above would mis-match, like cash flow) that a
+# company-level total does not answer.
+SEGMENT_TERMS = ("cloud", "azure", "data center", "gaming", "advertising", "ads", "search", "youtube", "segment",
+                 "automotive", "professional visualization", "intelligent cloud", "productivity",
+                 "personal computing", "other bets", "services", "subscription", "region", "geographic",
+                 "cash flow", "cash flows", "per employee", "quarter", "quarterly", "q1", "q2", "q3", "q4")
+# Line items whose names contain a metric alias but are different figures: "deferred revenue" is a
+# liability, "current assets" a subtotal, "sales and marketing" an expense.
+QUALIFIED_TERMS = ("deferred revenue", "deferred revenues", "unearned revenue", "unearned revenues",
+                   "revenue recognized", "current assets", "non-current assets", "noncurrent assets",
+                   "intangible assets", "other assets", "net assets", "restricted cash", "cash dividends",
+                   "cash paid", "cash used", "net cash", "sales and marketing", "sales & marketing",
+                   "marketing and sales", "sales tax", "other income", "comprehensive income")
+# Adjustments that change what a reported total means, e.g. "revenue excluding acquisitions".
+ADJUSTMENT_TERMS = ("excluding", "exclude", "excludes", "ex", "adjusted", "non-gaap", "pro forma", "organic",
+                    "constant currency", "dividend", "dividends", "buyback", "buybacks", "repurchase",
+                    "repurchases", "acquisition", "acquisitions", "acquired")
+QUALITATIVE_TERMS = ("why", "explain", "strategy", "strategies", "risk", "risks", "describe", "outlook",
+                     "initiative", "initiatives", "driver", "drivers", "focus")
+
+RANK_TERMS = {"highest": True, "largest": True, "most": True, "biggest": True, "top": True, "fastest": True,
+              "best": True, "lowest": False, "smallest": False, "least": False, "worst": False, "slowest": False}
+GROWTH_TERMS = ("grow", "grew", "growth", "increase", "increased", "decrease", "decreased", "change", "changed",
+                "rise", "rose", "decline", "declined")
+COMPARE_TERMS = ("compare", "comparison", "versus", "vs", "relative to", "between")
+SHARE_TERMS = ("as a percentage of", "as a percent of", "as a share of", "percentage of", "% of", "share of")
+
+# Question-frame words a facts question may contain besides the phrases above. Any other word
+# (a region, "per share", "operating cash") qualifies the metric in a way the facts store does not.
+FRAME_WORDS = frozenset((
+    "what", "whats", "which", "who", "how", "much", "many", "was", "were", "is", "are", "be", "been", "did", "do",
+    "does", "had", "has", "have", "the", "a", "an", "of", "in", "for", "at", "on", "to", "from", "by", "and", "or",
+    "with", "its", "their", "it", "they", "that", "this", "than", "over", "during", "end", "ending", "ended",
+    "year", "years", "fiscal", "fy", "company", "companies", "s", "report", "reports", "reported", "hold", "held",
+    "record", "recorded", "post", "posted", "generate", "generated", "earn", "earned", "spend", "spent", "make",
+    "made", "show", "tell", "me", "give", "list", "please", "amount", "figure", "value", "all", "three", "two",
+    "both", "each", "among", "across", "total", "respectively",
+))
+
+_YEAR = re.compile(r"\b(?:fiscal(?:\s+year)?\s*|fy\s*)?((?:19|20)\d{2})\b", re.IGNORECASE)
+_WORD = re.compile(r"[a-z0-9&]+", re.IGNORECASE)
+
+
+class PhraseMatcher:
+    """Case-insensitive, word-bounded matcher for many phrases, compiled into one regex.
+
+    Longer phrases are tried first, so "operating margin" wins over "margin" and
+    "total revenue" over "revenue"; matches never overlap.
+    """
+
+    def __init__(self, phrases: Dict[str, str]):
+        self.phrases = {phrase.lower(): value for phrase, value in phrases.items()}
+        alternation = "|".join(re.escape(phrase) for phrase in sorted(self.phrases, key=len, reverse=True))
+        # \b fails next to non-word characters such as "%", so boundaries are written as lookarounds.
+        self._pattern = re.compile(rf"(?<!\w)(?:{alternation})(?!\w)", re.IGNORECASE)
+
+    def matches(self, text: str) -> List[Tuple[int, int, str]]:
+        """(start, end, value) for every match, in order of appearance"""
+        return [(match.start(), match.end(), self.phrases[match.group(0).lower()])
+                for match in self._pattern.finditer(text)]
+
+    def find(self, text: str) -> List[Tuple[int, str]]:
+        """(position, value) for every match, in order of appearance"""
+        return [(start, value) for start, _, value in self.matches(text)]
+
+    def values(self, text: str) -> List[str]:
+        """Distinct matched values in order of first appearance"""
+        seen: Dict[str, None] = {}
+        for _, value in self.find(text):
+            seen.setdefault(value)
+        return list(seen)
+
+
+def _phrase_map(groups: Iterable[Tuple[str, Iterable[str]]]) -> Dict[str, str]:
+    return {alias: value for value, aliases in groups for alias in aliases}
+
+
+COMPANY_MATCHER = PhraseMatcher({**_phrase_map((ticker, aliases) for ticker, (_, aliases) in COMPANIES.items()),
+                                 **{phrase: "*" for phrase in ALL_COMPANIES}})
+METRIC_MATCHER = PhraseMatcher(_phrase_map((name, metric.aliases) for name, metric in METRICS.items()))
+SEGMENT_MATCHER = PhraseMatcher({term: term for term in SEGMENT_TERMS})
+QUALIFIED_MATCHER = PhraseMatcher({term: term for term in QUALIFIED_TERMS})
+ADJUSTMENT_MATCHER = PhraseMatcher({term: term for term in ADJUSTMENT_TERMS})
+QUALITATIVE_MATCHER = PhraseMatcher({term: term for term in QUALITATIVE_TERMS})
+RANK_MATCHER = PhraseMatcher({term: term for term in RANK_TERMS})
+GROWTH_MATCHER = PhraseMatcher({term: term for term in GROWTH_TERMS})
+COMPARE_MATCHER = PhraseMatcher({term: term for term in COMPARE_TERMS})
+SHARE_MATCHER = PhraseMatcher({term: term for term in SHARE_TERMS})
+
+
+def find_companies(text: str) -> List[str]:
+    """Tickers mentioned in `text`; a phrase like "all three" expands to every company"""
+    tickers = COMPANY_MATCHER.values(text)
+    if "*" in tickers:
+        return list(COMPANIES)
+    return tickers
+
+
+def find_metrics(text: str) -> List[Tuple[int, str]]:
+    return METRIC_MATCHER.find(text)
+
+
+def find_years(text: str) -> List[str]:
+    seen: Dict[str, None] = {}
+    for match in _YEAR.finditer(text):
+        seen.setdefault(match.group(1))
+    return list(seen)
+
+
+def unmatched_words(text: str, matchers: Iterable[PhraseMatcher]) -> List[str]:
+    """Words of `text` outside every match of `matchers`, fiscal years and FRAME_WORDS"""
+    spans = [(start, end) for matcher in matchers for start, end, _ in matcher.matches(text)]
+    spans += [match.span() for match in _YEAR.finditer(text)]
+    return [match.group(0) for match in _WORD.finditer(text)
+            if match.group(0).lower() not in FRAME_WORDS
+            and not any(start <= match.start() and match.end() <= end for start, end in spans)]
+
+
+def company_name(ticker: str) -> str:
+    return COMPANIES[ticker][0] if ticker in COMPANIES else ticker
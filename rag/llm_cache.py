@@ -0,0 +1,93 @@
+from pathlib import Path
+from typing import Dict, Optional
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+class CompletionCache:
+    """On-disk LRU cache of LLM completions with a time-to-live.
+
+    Entries are keyed by (model, whitespace-normalized prompt, temperature, max_tokens),
+    so the indented prompt templates in QueryAgent hit regardless of formatting.
+    """
+
+    def __init__(self, path: str = "llm_cache.sqlite", max_entries: int = 10_000,
+                 ttl_seconds: Optional[float] = 7 * 24 * 3600, enabled: bool = True):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if enabled:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, completion TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed)")
+            self._conn.commit()
+
+    @staticmethod
+    def key(model: str, prompt: str, temperature: float, max_tokens: int) -> str:
+        payload = json.dumps([model, " ".join(prompt.split()), temperature, max_tokens])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT completion, created FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE completions SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, completion: str):
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, completion, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, completion, now, now),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM completions WHERE key IN "
+                    "(SELECT key FROM completions ORDER BY accessed ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def clear(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM completions")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            self.enabled = False
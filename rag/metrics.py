@@ -0,0 +1,289 @@
+from abc import ABC, abstractmethod
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+import cProfile
+import io
+import json
+import math
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+PROFILE_MODES = ("cpu", "memory")
+QUANTILES = (0.5, 0.9, 0.99)
+
+_current: ContextVar[Optional["QueryTrace"]] = ContextVar("rag_query_trace", default=None)
+
+
+class QueryTrace:
+    """Timing spans and counters collected while one query is processed"""
+
+    def __init__(self, query: str):
+        self.query = query
+        self.timestamp = time.time()
+        self.started = time.perf_counter()
+        self.total_ms: Optional[float] = None
+        self.spans: List[Dict[str, Any]] = []
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.profile: Optional[str] = None
+        # Retrieval runs on pool threads, so spans may arrive from several threads at once.
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, started: float, ended: float):
+        with self._lock:
+            self.spans.append({"name": name, "start_ms": (started - self.started) * 1000,
+                               "duration_ms": (ended - started) * 1000})
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] += value
+
+    def stage_ms(self) -> Dict[str, float]:
+        """Total milliseconds per stage name; a stage entered twice (e.g. two LLM calls) is summed"""
+        stages: Dict[str, float] = defaultdict(float)
+        with self._lock:
+            for entry in self.spans:
+                stages[entry["name"]] += entry["duration_ms"]
+        if self.total_ms is not None:
+            stages["total"] = self.total_ms
+        return dict(stages)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans, counters = list(self.spans), dict(self.counters)
+        record = {
+            "query": self.query,
+            "timestamp": self.timestamp,
+            "total_ms": self.total_ms,
+            "stages": self.stage_ms(),
+            "spans": spans,
+            "counters": counters,
+        }
+        if self.profile is not None:
+            record["profile"] = self.profile
+        return record
+
+
+def current_trace() -> Optional[QueryTrace]:
+    return _current.get()
+
+
+@contextmanager
+def use_trace(trace: Optional[QueryTrace]) -> Iterator[None]:
+    """Make `trace` the active trace for the enclosed block only.
+
+    Generators wrap each step in this rather than holding a trace open across a yield, which
+    would leak it to the consumer and break when steps run in different contexts.
+    """
+    token = _current.set(trace)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time the enclosed block as stage `name` of the active query trace; a no-op without one"""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(name, started, time.perf_counter())
+
+
+def count(name: str, value: int = 1):
+    trace = _current.get()
+    if trace is not None:
+        trace.count(name, value)
+
+
+def record_usage(response: Any):
+    """Add the prompt/completion token counts reported by an LLM response to the active trace"""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        # Groq reports usage of a streamed completion on the final chunk's x_groq field.
+        usage = getattr(getattr(response, "x_groq", None), "usage", None)
+    if usage is None:
+        return
+    count("prompt_tokens", getattr(usage, "prompt_tokens", 0) or 0)
+    count("completion_tokens", getattr(usage, "completion_tokens", 0) or 0)
+
+
+class MetricsSink(ABC):
+    """Receives one record (QueryTrace.to_dict()) per finished query"""
+
+    @abstractmethod
+    def emit(self, record: Dict[str, Any]):
+        ...
+
+
+class PrometheusSink(MetricsSink):
+    """Aggregates stage latencies and counters and renders them in the Prometheus text format.
+
+    Stage latencies are exported as summaries whose quantiles cover the last `window` queries.
+    `write` replaces a file atomically, e.g. for the node_exporter textfile collector.
+    """
+
+    def __init__(self, window: int = 1000, prefix: str = "rag"):
+        self.window = window
+        self.prefix = prefix
+        self.queries = 0
+        self._samples: Dict[str, Deque[float]] = {}
+        self._sums: Dict[str, float] = defaultdict(float)
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._counters: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def emit(self, record: Dict[str, Any]):
+        with self._lock:
+            self.queries += 1
+            for stage, ms in record["stages"].items():
+                self._samples.setdefault(stage, deque(maxlen=self.window)).append(ms / 1000)
+                self._sums[stage] += ms / 1000
+                self._counts[stage] += 1
+            for name, value in record["counters"].items():
+                self._counters[name] += value
+
+    def _snapshot(self) -> Tuple[int, Dict[str, Tuple[List[float], float, int]], Dict[str, int]]:
+        """(queries, {stage: (sorted samples, sum, count)}, counters), consistent with each other"""
+        with self._lock:
+            stages = {stage: (list(samples), self._sums[stage], self._counts[stage])
+                      for stage, samples in self._samples.items()}
+            queries, counters = self.queries, dict(self._counters)
+        for samples, _, _ in stages.values():
+            samples.sort()
+        return queries, stages, counters
+
+    @staticmethod
+    def _quantiles(samples: List[float]) -> Dict[float, float]:
+        if not samples:
+            return {}
+        # Nearest-rank quantiles over sorted samples
+        return {q: samples[max(math.ceil(q * len(samples)) - 1, 0)] for q in QUANTILES}
+
+    def quantiles(self, stage: str) -> Dict[float, float]:
+        """Latency quantiles in seconds for one stage over the retained window"""
+        with self._lock:
+            samples = sorted(self._samples.get(stage, ()))
+        return self._quantiles(samples)
+
+    def render(self) -> str:
+        queries, stages, counters = self._snapshot()
+        name = f"{self.prefix}_query_stage_seconds"
+        lines = [f"# HELP {name} Latency of each query processing stage",
+                 f"# TYPE {name} summary"]
+        for stage, (samples, total, observations) in sorted(stages.items()):
+            for q, seconds in self._quantiles(samples).items():
+                lines.append(f'{name}{{stage="{stage}",quantile="{q}"}} {seconds:.6f}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {observations}')
+        lines += [f"# HELP {self.prefix}_queries_total Queries processed",
+                  f"# TYPE {self.prefix}_queries_total counter",
+                  f"{self.prefix}_queries_total {queries}"]
+        events = f"{self.prefix}_query_events_total"
+        lines += [f"# HELP {events} Tokens, LLM calls, cache hits and retrieval hits across queries",
+                  f"# TYPE {events} counter"]
+        lines += [f'{events}{{event="{event}"}} {value}' for event, value in sorted(counters.items())]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+    def format_summary(self) -> str:
+        queries, stages, counters = self._snapshot()
+        lines = [f"Stage latency over {queries} queries (ms):"]
+        for stage in sorted(stages, key=lambda stage: stage == "total"):
+            quantiles = self._quantiles(stages[stage][0])
+            lines.append(f"  {stage:<16} p50 {quantiles[0.5] * 1000:9.1f}  p99 {quantiles[0.99] * 1000:9.1f}")
+        if counters:
+            lines.append("  " + ", ".join(f"{name}={value}" for name, value in sorted(counters.items())))
+        return "\n".join(lines)
+
+
+class JsonlTraceSink(MetricsSink):
+    """Appends every query trace as one JSON line"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, record: Dict[str, Any]):
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+class QueryTracer:
+    """Opens a QueryTrace per query and hands the finished record to every sink.
+
+    `profile="cpu"` runs cProfile around the query and `profile="memory"` tracks allocations
+    with tracemalloc; the top entries are stored in the record's "profile" field. cProfile
+    only sees the calling thread, and tracemalloc is process-wide, so profile one query at a time.
+    """
+
+    def __init__(self, sinks: Optional[List[MetricsSink]] = None, profile: Optional[str] = None,
+                 profile_limit: int = 20):
+        if profile is not None and profile not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {profile!r}, expected one of {PROFILE_MODES}")
+        self.sinks = list(sinks or [])
+        self.profile = profile
+        self.profile_limit = profile_limit
+
+    @contextmanager
+    def trace(self, query: str, activate: bool = True) -> Iterator[QueryTrace]:
+        """Collect and emit one query's trace; with activate=False the caller makes it current
+        itself with use_trace, e.g. around each step of a generator"""
+        trace = QueryTrace(query)
+        token = _current.set(trace) if activate else None
+        profiler = cProfile.Profile() if self.profile == "cpu" else None
+        started_tracemalloc = self.profile == "memory" and not tracemalloc.is_tracing()
+        if profiler is not None:
+            profiler.enable()
+        if started_tracemalloc:
+            tracemalloc.start()
+        try:
+            yield trace
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                trace.profile = self._cpu_report(profiler)
+            if self.profile == "memory":
+                trace.profile = self._memory_report()
+                if started_tracemalloc:
+                    tracemalloc.stop()
+            trace.total_ms = (time.perf_counter() - trace.started) * 1000
+            if token is not None:
+                _current.reset(token)
+            self._emit(trace.to_dict())
+
+    def _cpu_report(self, profiler: cProfile.Profile) -> str:
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(self.profile_limit)
+        return out.getvalue()
+
+    def _memory_report(self) -> str:
+        current, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics("lineno")[:self.profile_limit]
+        lines = [f"current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB"]
+        lines += [str(stat) for stat in top]
+        return "\n".join(lines)
+
+    def _emit(self, record: Dict[str, Any]):
+        for sink in self.sinks:
+            try:
+                sink.emit(record)
+            except Exception as e:
+                print(f"⚠️ Metrics sink {type(sink).__name__} failed: {e}")
@@ -0,0 +1,75 @@
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+
+
+class OnnxQueryEncoder:
+    """Sentence-transformers compatible query encoder on ONNX Runtime.
+
+    Runs an exported (optionally int8-quantized) transformer with mean pooling and L2
+    normalization, matching all-MiniLM-L6-v2, without importing torch. Needs the
+    `onnxruntime` and `tokenizers` packages and a directory written by `export_onnx`.
+    """
+
+    def __init__(self, model_dir: str, max_length: int = 256, threads: Optional[int] = None):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        path = Path(model_dir)
+        model_path = path / "model_quantized.onnx"
+        if not model_path.exists():
+            model_path = path / "model.onnx"
+        # Identifies this export for caches of its embeddings, which differ from the torch model's
+        stat = model_path.stat()
+        self.name = f"onnx-{path.resolve().name}-{model_path.stem}-{stat.st_size}-{stat.st_mtime_ns}"
+        self.tokenizer = Tokenizer.from_file(str(path / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.enable_padding()
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self._inputs = {node.name for node in self.session.get_inputs()}
+
+    def encode(self, texts: List[str], batch_size: int = 32, **kwargs) -> np.ndarray:
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            feed: Dict[str, np.ndarray] = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            token_embeddings = self.session.run(None, {name: feed[name] for name in self._inputs})[0]
+            mask = feed["attention_mask"][:, :, None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            batches.append(pooled.astype(np.float32))
+        return np.concatenate(batches) if batches else np.empty((0, 0), dtype=np.float32)
+
+
+def export_onnx(model_name: str, output_dir: str, quantize: bool = True) -> Path:
+    """Export a SentenceTransformer's transformer to ONNX (plus a dynamic int8 copy) for OnnxQueryEncoder"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    path = Path(output_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    tokenizer.save_pretrained(str(path))
+
+    sample = tokenizer(["revenue growth in fiscal 2024"], return_tensors="pt")
+    names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in names}
+    dynamic_axes["token_embeddings"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer, tuple(sample[name] for name in names), str(path / "model.onnx"),
+            input_names=names, output_names=["token_embeddings"], dynamic_axes=dynamic_axes, opset_version=14,
+        )
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(str(path / "model.onnx"), str(path / "model_quantized.onnx"), weight_type=QuantType.QInt8)
+    return path
@@ -0,0 +1,223 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+from .chunker import Document, TextChunker
+from .html_extract import extract_text
+from .sec_data import SECDataAcquisition
+from .vectorstore import VectorStore
+
+STAGES = ("acquire", "extract", "embed", "index")
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    name: str
+    items: int = 0
+    busy_seconds: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        return self.items / self.busy_seconds if self.busy_seconds else 0.0
+
+
+def _extract_and_chunk(filepath: str, company: str, year: str,
+                       chunker: TextChunker) -> Tuple[List[Document], float]:
+    """Runs in a worker process: only the chunks, never the full text, travel back.
+
+    Returns the chunks and the seconds spent on them; a filing that fails to parse yields no
+    chunks instead of aborting the ingest.
+    """
+    started = time.perf_counter()
+    try:
+        text = extract_text(filepath)
+        documents = chunker.chunk_text(text, company, year, f"{company}_{year}_10K") if text else []
+    except Exception as e:
+        print(f"Error extracting text from {filepath}: {e}")
+        documents = []
+    return documents, time.perf_counter() - started
+
+
+class IngestionPipeline:
+    """Staged acquire → extract/chunk → embed → index pipeline with bounded queues.
+
+    Downloads run on a thread pool, extraction and chunking on a process pool, embedding in
+    micro-batches on its own thread and indexing on the calling thread, so every stage works
+    concurrently while the queues cap how many filings and chunks are in flight at once.
+    """
+
+    def __init__(self, data_acquisition: SECDataAcquisition, chunker: TextChunker, vector_store: VectorStore,
+                 extract_processes: Optional[int] = None, embed_batch_size: int = 256, queue_size: int = 4,
+                 report_truncation: bool = False):
+        self.data_acquisition = data_acquisition
+        self.chunker = chunker
+        self.vector_store = vector_store
+        self.extract_processes = extract_processes or os.cpu_count() or 1
+        self.embed_batch_size = embed_batch_size
+        self.queue_size = queue_size
+        self.stats: Dict[str, StageStats] = {name: StageStats(name) for name in STAGES}
+        # Tokenizing every chunk loads the encoder even when the embedding cache serves every batch,
+        # so the encoder truncation report is opt-in.
+        self.report_truncation = report_truncation
+        self.truncation = {"chunks": 0, "truncated_chunks": 0, "tokens": 0, "dropped_tokens": 0}
+        self.wall_seconds = 0.0
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+
+    def _put(self, q: queue.Queue, item: Any):
+        # Waits for room, but gives up once another stage has failed so nothing blocks forever.
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, q: queue.Queue) -> Any:
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _run_stage(self, target: Callable[..., None], *args) -> threading.Thread:
+        def run():
+            try:
+                target(*args)
+            except BaseException as e:
+                self._errors.append(e)
+                self._stop.set()
+        thread = threading.Thread(target=run, name=f"ingest-{target.__name__}", daemon=True)
+        thread.start()
+        return thread
+
+    def _acquire(self, filings: queue.Queue):
+        stats = self.stats["acquire"]
+        acquisition = self.data_acquisition
+        with ThreadPoolExecutor(max_workers=acquisition.max_workers, thread_name_prefix="sec") as pool:
+            started = time.perf_counter()
+            futures = {
+                pool.submit(acquisition.download_filing, filing['url'], company, filing['year']): (company, filing['year'])
+                for company, filing in acquisition.iter_filings()
+            }
+            for future in as_completed(futures):
+                filepath = future.result()
+                stats.items += 1
+                stats.busy_seconds = time.perf_counter() - started
+                if filepath:
+                    self._put(filings, (filepath, *futures[future]))
+        self._put(filings, _DONE)
+
+    def _extract(self, filings: queue.Queue, chunks: queue.Queue):
+        stats = self.stats["extract"]
+        pending: Deque[Tuple[Future, str, str]] = deque()
+
+        def drain_one():
+            future, company, year = pending.popleft()
+            documents, seconds = future.result()
+            stats.items += 1
+            # Worker time, not counting the wait in the pool's queue
+            stats.busy_seconds += seconds
+            print(f"Created {len(documents)} chunks for {company} {year}")
+            for start in range(0, len(documents), self.embed_batch_size):
+                self._put(chunks, documents[start:start + self.embed_batch_size])
+
+        # Download and embed threads are running by now; forking would copy their held locks.
+        with ProcessPoolExecutor(max_workers=self.extract_processes,
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            while True:
+                item = self._get(filings)
+                if item is _DONE:
+                    break
+                filepath, company, year = item
+                pending.append((pool.submit(_extract_and_chunk, filepath, company, year, self.chunker),
+                                company, year))
+                # Keep every worker busy, but no more filings in flight than that.
+                while len(pending) > self.extract_processes or (pending and pending[0][0].done()):
+                    drain_one()
+            while pending and not self._stop.is_set():
+                drain_one()
+        self._put(chunks, _DONE)
+
+    def _embed(self, chunks: queue.Queue, embedded: queue.Queue):
+        stats = self.stats["embed"]
+        batch: List[Document] = []
+
+        def flush():
+            started = time.perf_counter()
+            texts = [doc.content for doc in batch]
+            embeddings = self.vector_store.encode_documents(texts, verbose=False)
+            if self.report_truncation:
+                report = self.vector_store.truncation_report(batch)
+                for key in self.truncation:
+                    self.truncation[key] += report[key]
+            stats.items += len(batch)
+            stats.busy_seconds += time.perf_counter() - started
+            self._put(embedded, (batch, embeddings))
+
+        while True:
+            documents = self._get(chunks)
+            if documents is _DONE:
+                break
+            batch.extend(documents)
+            if len(batch) >= self.embed_batch_size:
+                flush()
+                batch = []
+        if batch:
+            flush()
+        self._put(embedded, _DONE)
+
+    def run(self) -> Dict[str, StageStats]:
+        """Ingest every filing into the vector store; returns per-stage statistics"""
+        filings: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        chunks: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        embedded: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        started = time.perf_counter()
+        threads = [
+            self._run_stage(self._acquire, filings),
+            self._run_stage(self._extract, filings, chunks),
+            self._run_stage(self._embed, chunks, embedded),
+        ]
+
+        stats = self.stats["index"]
+        while True:
+            item = self._get(embedded)
+            if item is _DONE:
+                break
+            documents, embeddings = item
+            index_started = time.perf_counter()
+            try:
+                self.vector_store.add_documents(documents, embeddings=embeddings, verbose=False)
+            except BaseException:
+                self._stop.set()
+                raise
+            stats.items += len(documents)
+            stats.busy_seconds += time.perf_counter() - index_started
+
+        for thread in threads:
+            thread.join()
+        if self._errors:
+            raise self._errors[0]
+        self.wall_seconds = time.perf_counter() - started
+        return self.stats
+
+    def format_stats(self) -> str:
+        lines = [f"Ingested {self.stats['index'].items} chunks in {self.wall_seconds:.1f}s"]
+        for stage in self.stats.values():
+            unit = "filings" if stage.name in ("acquire", "extract") else "chunks"
+            lines.append(f"  {stage.name:<8} {stage.items:>7} {unit:<7} busy {stage.busy_seconds:7.2f}s  "
+                         f"{stage.throughput:9.1f} {unit}/s")
+        if self.truncation["chunks"]:
+            lines.append(f"Encoder truncation: {self.truncation['truncated_chunks']}/{self.truncation['chunks']} "
+                         f"chunks exceed {self.vector_store.max_tokens} tokens, "
+                         f"{self.truncation['dropped_tokens'] / max(self.truncation['tokens'], 1):.1%} "
+                         f"of tokens dropped")
+        return "\n".join(lines)
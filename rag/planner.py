@@ -0,0 +1,71 @@
+from typing import Dict, List, Optional
+import threading
+
+from .lexicon import (
+    COMPARE_TERMS, COMPANIES, GROWTH_TERMS, METRIC_MATCHER, RANK_TERMS, SEGMENT_MATCHER, PhraseMatcher,
+    company_name, find_companies, find_years,
+)
+
+# Word-bounded, unlike the old substring scan where "to" or "vs" matched inside other words.
+DECOMPOSITION_MATCHER = PhraseMatcher({term: term for term in (*COMPARE_TERMS, *RANK_TERMS, *GROWTH_TERMS,
+                                                               "which", "difference")})
+
+
+class QueryPlanner:
+    """Deterministic query decomposition from the lexicon of companies, metrics and years.
+
+    A comparison is expanded into one sub-query per company × metric × fiscal year, e.g.
+    "Compare R&D spending as a percentage of revenue across all three companies in 2023" becomes
+    "Microsoft R&D spending 2023", "Microsoft revenue 2023", ... without an LLM call.
+    `plan` returns None when the query names no company or metric it knows, so the caller
+    can fall back to LLM decomposition.
+    """
+
+    def __init__(self, max_sub_queries: int = 12):
+        self.max_sub_queries = max_sub_queries
+        self.planned = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    def needs_decomposition(self, query: str) -> bool:
+        return (len(find_companies(query)) > 1 or len(find_years(query)) > 1
+                or bool(DECOMPOSITION_MATCHER.find(query)))
+
+    def _expand(self, query: str) -> Optional[List[str]]:
+        companies = find_companies(query)
+        if not companies and DECOMPOSITION_MATCHER.find(query):
+            # "Which company had the highest ..." ranges over every company.
+            companies = list(COMPANIES)
+        # Metrics are phrased as the query phrases them, one sub-query per distinct metric.
+        metrics: Dict[str, str] = {}
+        for start, end, name in METRIC_MATCHER.matches(query):
+            metrics.setdefault(name, query[start:end])
+        if not companies or not metrics:
+            return None
+
+        years = find_years(query)
+        if len(years) == 1 and any(term in GROWTH_TERMS for _, term in DECOMPOSITION_MATCHER.find(query)):
+            years = [str(int(years[0]) - 1), years[0]]
+        # Segment qualifiers ("cloud", "data center") narrow the metric in every sub-query.
+        qualifier = " ".join(SEGMENT_MATCHER.values(query))
+        sub_queries = [
+            " ".join(part for part in (company_name(company), qualifier, phrase, year) if part)
+            for company in companies for phrase in metrics.values() for year in (years or [""])
+        ]
+        if len(sub_queries) > self.max_sub_queries:
+            return None
+        return sub_queries
+
+    def plan(self, query: str) -> Optional[List[str]]:
+        sub_queries = self._expand(query)
+        with self._lock:
+            if sub_queries is None:
+                self.fallbacks += 1
+            else:
+                self.planned += 1
+        return sub_queries
+
+    def stats(self) -> Dict[str, float]:
+        total = self.planned + self.fallbacks
+        return {"planned": self.planned, "llm_fallbacks": self.fallbacks,
+                "hit_rate": self.planned / total if total else 0.0}
@@ -0,0 +1,162 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import json
+import os
+import re
+import threading
+import unicodedata
+import numpy as np
+
+from .metrics import count
+
+
+def normalize_query(query: str) -> str:
+    """Cache key of a query: NFKC, case-folded, whitespace collapsed.
+
+    Case folding is safe for the uncased all-MiniLM-L6-v2 tokenizer, which lowercases anyway;
+    pass case_sensitive=True to QueryEmbeddingCache for a cased encoder.
+    """
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU of normalized query string -> L2-normalized query embedding.
+
+    Embeddings live in one preallocated (capacity, dimension) float32 arena; the LRU order maps
+    each key to its arena row, and an evicted entry's row is reused by the next insert. Safe to
+    share between threads; encoding happens outside the lock. With `cache_dir`, `save` writes
+    the entries (most recently used last) and the next process loads them.
+    """
+
+    def __init__(self, model_name: str, capacity: int = 4096, cache_dir: Optional[str] = None,
+                 case_sensitive: bool = False):
+        if capacity <= 0:
+            raise ValueError(f"capacity must be positive, got {capacity}")
+        self.model_name = model_name
+        self.capacity = capacity
+        self.case_sensitive = case_sensitive
+        self.path = Path(cache_dir) / re.sub(r"[^A-Za-z0-9_.-]", "_", model_name) if cache_dir else None
+        self.hits = 0
+        self.misses = 0
+
+        # Allocated on the first insert, once the embedding dimension is known.
+        self._vectors: Optional[np.ndarray] = None
+        self._rows: "OrderedDict[str, int]" = OrderedDict()
+        self._free: List[int] = []
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def key(self, query: str) -> str:
+        return " ".join(query.split()) if self.case_sensitive else normalize_query(query)
+
+    def encode(self, queries: List[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Embeddings for queries, calling encode_fn (which must L2-normalize) only for misses"""
+        keys = [self.key(query) for query in queries]
+        out: Optional[np.ndarray] = None
+        missing: Dict[str, List[int]] = {}
+        with self._lock:
+            if self._vectors is not None:
+                out = np.empty((len(queries), self._vectors.shape[1]), dtype=np.float32)
+            for i, key in enumerate(keys):
+                row = self._rows.get(key)
+                if row is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    self._rows.move_to_end(key)
+                    out[i] = self._vectors[row]
+            hits = len(queries) - sum(len(positions) for positions in missing.values())
+            self.hits += hits
+            self.misses += len(queries) - hits
+        count("query_embedding_hits", hits)
+        count("query_embedding_misses", len(queries) - hits)
+        if not missing:
+            return out
+
+        # Repeated queries in one batch are encoded once.
+        fresh = np.asarray(encode_fn([queries[positions[0]] for positions in missing.values()]), dtype=np.float32)
+        if fresh.ndim == 1:
+            fresh = fresh.reshape(1, -1)
+        if out is None:
+            out = np.empty((len(queries), fresh.shape[1]), dtype=np.float32)
+        for vector, positions in zip(fresh, missing.values()):
+            out[positions] = vector
+        with self._lock:
+            for key, vector in zip(missing, fresh):
+                self._put(key, vector)
+        return out
+
+    def _put(self, key: str, vector: np.ndarray):
+        if self._vectors is None:
+            self._vectors = np.empty((self.capacity, vector.shape[0]), dtype=np.float32)
+            self._free = list(range(self.capacity - 1, -1, -1))
+        elif self._vectors.shape[1] != vector.shape[0]:
+            raise ValueError(f"Embedding dimension changed from {self._vectors.shape[1]} to {vector.shape[0]}")
+        row = self._rows.get(key)
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+            else:
+                _, row = self._rows.popitem(last=False)
+        self._rows[key] = row
+        self._rows.move_to_end(key)
+        self._vectors[row] = vector
+        self._dirty = True
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+            self._free = list(range(self.capacity - 1, -1, -1)) if self._vectors is not None else []
+            self._dirty = True
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._rows),
+            "capacity": self.capacity,
+        }
+
+    def save(self):
+        if self.path is None or not self._dirty:
+            return
+        with self._lock:
+            keys = list(self._rows)
+            vectors = (self._vectors[list(self._rows.values())] if self._vectors is not None
+                       else np.empty((0, 0), dtype=np.float32))
+            self._dirty = False
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp = self.path / "vectors.tmp.npy"
+        np.save(tmp, vectors)
+        os.replace(tmp, self.path / "vectors.npy")
+        tmp = self.path / "keys.tmp.json"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"model_name": self.model_name, "case_sensitive": self.case_sensitive, "keys": keys}, f)
+        os.replace(tmp, self.path / "keys.json")
+
+    def _load(self):
+        if self.path is None or not (self.path / "keys.json").exists():
+            return
+        try:
+            with open(self.path / "keys.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("model_name") != self.model_name or meta.get("case_sensitive") != self.case_sensitive:
+                return
+            keys = meta["keys"]
+            vectors = np.load(self.path / "vectors.npy")
+            if len(keys) != len(vectors):
+                print(f"⚠️ Query embedding cache at {self.path} is inconsistent, starting empty")
+                return
+        except Exception as e:
+            print(f"⚠️ Error loading query embedding cache {self.path}: {e}")
+            return
+        # Keys are stored least recently used first, so a smaller capacity keeps the most recent.
+        for key, vector in zip(keys[-self.capacity:], vectors[-self.capacity:]):
+            self._put(key, vector)
+        self._dirty = False
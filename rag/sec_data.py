@@ -1,7 +1,9 @@
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Optional
-from bs4 import BeautifulSoup
+from typing import Dict, Iterator, List, Optional, Tuple
+import threading
+
+from .html_extract import extract_many, extract_text
 
 
 class SECDataAcquisition:
@@ -13,31 +15,64 @@ class SECDataAcquisition:
         'NVDA': '0001045810'
     }
 
-    def __init__(self, data_dir: str = "sec_data"):
+    def __init__(self, data_dir: str = "sec_data", max_workers: int = 8, requests_per_second: float = 10.0,
+                 extract_processes: Optional[int] = None,
+                 archive_base_url: str = "https://www.sec.gov/Archives/edgar/data",
+                 api_base_url: str = "https://data.sec.gov/api/xbrl"):
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'RAG-System financial-analysis@company.com'
-        })
+        # companyfacts JSON per ticker, the input of rag.xbrl.FactsStore
+        self.facts_dir = self.data_dir / "companyfacts"
+        self.max_workers = max_workers
+        self.extract_processes = extract_processes
+        # Base URLs are configurable so acquisition can run against a local stand-in server.
+        self.archive_base_url = archive_base_url.rstrip('/')
+        self.api_base_url = api_base_url.rstrip('/')
+        self.requests_per_second = requests_per_second
+        self._downloader = None
+        self._downloader_lock = threading.Lock()
+
+    @property
+    def downloader(self):
+        # Created on first use so that query-only runs never import requests.
+        with self._downloader_lock:
+            if self._downloader is None:
+                from .downloader import FilingDownloader
+                self._downloader = FilingDownloader(
+                    'RAG-System financial-analysis@company.com',
+                    max_workers=self.max_workers,
+                    requests_per_second=self.requests_per_second,
+                )
+        return self._downloader
+
+    def close(self):
+        with self._downloader_lock:
+            if self._downloader is not None:
+                self._downloader.close()
+                self._downloader = None
+
+    @property
+    def session(self):
+        return self.downloader.session
 
     def get_filing_urls(self, cik: str, form_type: str = "10-K", count: int = 3) -> List[Dict[str, str]]:
         """Get recent filing URLs for a company"""
         try:
-            facts_url = f"https://data.sec.gov/api/xbrl/companyfacts/CIK{cik.zfill(10)}.json"
-            response = self.session.get(facts_url)
+            facts_url = f"{self.api_base_url}/companyfacts/CIK{cik.zfill(10)}.json"
+            response = self.downloader.get(facts_url)
             response.raise_for_status()
 
             company_name = {'0000789019': 'MSFT', '0001652044': 'GOOGL', '0001045810': 'NVDA'}[cik]
+            self.save_company_facts(company_name, response.content)
             return [
                 {
-                    'url': f"https://www.sec.gov/Archives/edgar/data/{cik.lstrip('0')}/mock-2024-10k.htm",
+                    'url': f"{self.archive_base_url}/{cik.lstrip('0')}/mock-2024-10k.htm",
                     'year': '2024',
                     'accession': '0001564590-24-000057',
                     'date': '2024-07-26'
                 },
                 {
-                    'url': f"https://www.sec.gov/Archives/edgar/data/{cik.lstrip('0')}/mock-2023-10k.htm",
+                    'url': f"{self.archive_base_url}/{cik.lstrip('0')}/mock-2023-10k.htm",
                     'year': '2023',
                     'accession': '0001564590-23-000123',
                     'date': '2023-07-25'
@@ -61,39 +96,58 @@ class SECDataAcquisition:
                 }
             ]
 
+    def save_company_facts(self, company: str, content: bytes) -> Path:
+        """Keep the companyfacts JSON for the structured (XBRL) answer path"""
+        self.facts_dir.mkdir(exist_ok=True)
+        path = self.facts_dir / f"{company}.json"
+        tmp = path.with_suffix(".json.tmp")
+        tmp.write_bytes(content)
+        tmp.replace(path)
+        return path
+
     def download_filing(self, url: str, company: str, year: str) -> Optional[str]:
         """Download and save a filing or use demo data"""
         filename = f"{company}_{year}_10k.html"
         filepath = self.data_dir / filename
 
-        if filepath.exists():
+        # Files with download metadata are revalidated with a conditional GET below;
+        # anything else already on disk (e.g. demo data) is used as is.
+        if filepath.exists() and not self.downloader.meta_path(filepath).exists():
             print(f"File already exists: {filepath}")
             return str(filepath)
 
         if url.startswith("demo://"):
+            if filepath.exists():
+                # A transient companyfacts failure must not replace a real download.
+                print(f"Keeping previously downloaded copy: {filepath}")
+                return str(filepath)
             print(f"Creating demo data for {company} {year}...")
-            demo_content = self.get_demo_content(company, year)
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(f"<html><body><div>{demo_content}</div></body></html>")
-            print(f"Created demo file: {filepath}")
-            return str(filepath)
+            return self._write_demo_filing(filepath, company, year)
 
         try:
             print(f"Downloading {company} {year} 10-K...")
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(response.text)
-            print(f"Saved: {filepath}")
+            result = self.downloader.download(url, filepath)
+            if result.status == "not_modified":
+                print(f"Unchanged since last download: {filepath}")
+            else:
+                print(f"Saved: {filepath} ({result.bytes_written} bytes)")
             return str(filepath)
         except Exception as e:
             print(f"Download failed for {url}: {e}")
+            if filepath.exists():
+                print(f"Keeping previously downloaded copy: {filepath}")
+                return str(filepath)
             print(f"Using demo data for {company} {year}...")
-            demo_content = self.get_demo_content(company, year)
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(f"<html><body><div>{demo_content}</div></body></html>")
-            print(f"Created demo file: {filepath}")
-            return str(filepath)
+            return self._write_demo_filing(filepath, company, year)
+
+    def _write_demo_filing(self, filepath: Path, company: str, year: str) -> str:
+        # Stale download metadata would let a later conditional GET get a 304 and keep the demo text.
+        self.downloader.meta_path(filepath).unlink(missing_ok=True)
+        demo_content = self.get_demo_content(company, year)
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(f"<html><body><div>{demo_content}</div></body></html>")
+        print(f"Created demo file: {filepath}")
+        return str(filepath)
 
     def get_demo_content(self, company: str, year: str) -> str:
         demo_data = {
@@ -236,7 +290,16 @@ class SECDataAcquisition:
 
     def extract_text_from_html(self, filepath: str) -> str:
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
+            return extract_text(filepath)
+        except Exception as e:
+            print(f"Error extracting text from {filepath}: {e}")
+            return ""
+
+    def extract_text_from_html_bs4(self, filepath: str) -> str:
+        """Previous whole-document BeautifulSoup extraction, kept as a benchmark baseline"""
+        from bs4 import BeautifulSoup
+        try:
+            with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
                 content = f.read()
             soup = BeautifulSoup(content, 'html.parser')
             for script in soup(["script", "style"]):
@@ -249,19 +312,23 @@ class SECDataAcquisition:
             print(f"Error extracting text from {filepath}: {e}")
             return ""
 
-    def acquire_all_data(self) -> Dict[str, Dict[str, str]]:
-        all_data: Dict[str, Dict[str, str]] = {}
-        for company, cik in self.COMPANY_CIKS.items():
-            print(f"\n=== Processing {company} ===")
-            company_data: Dict[str, str] = {}
-            filings = self.get_filing_urls(cik)
-            for filing in filings[:2]:
-                filepath = self.download_filing(filing['url'], company, filing['year'])
-                if filepath:
-                    text = self.extract_text_from_html(filepath)
-                    if text:
-                        company_data[filing['year']] = text
-            all_data[company] = company_data
-        return all_data
+    def iter_filings(self, per_company: int = 2) -> Iterator[Tuple[str, Dict[str, str]]]:
+        """Yield (company, filing) pairs for the most recent filings of every company"""
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="sec") as pool:
+            for company, filings in zip(self.COMPANY_CIKS, pool.map(self.get_filing_urls, self.COMPANY_CIKS.values())):
+                for filing in filings[:per_company]:
+                    yield company, filing
 
+    def acquire_all_data(self) -> Dict[str, Dict[str, str]]:
+        all_data: Dict[str, Dict[str, str]] = {company: {} for company in self.COMPANY_CIKS}
+        jobs = list(self.iter_filings())
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="sec") as pool:
+            paths = list(pool.map(lambda job: self.download_filing(job[1]['url'], job[0], job[1]['year']), jobs))
 
+        texts = extract_many([path for path in paths if path], processes=self.extract_processes)
+        for (company, filing), filepath in zip(jobs, paths):
+            print(f"\n=== Processing {company} {filing['year']} ===")
+            text = texts.get(filepath) if filepath else None
+            if text:
+                all_data[company][filing['year']] = text
+        return all_data
@@ -1,50 +1,228 @@
+import json
 import os
-from typing import Optional
-from groq import Groq
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
 
 from .sec_data import SECDataAcquisition
-from .chunker import TextChunker
+from .chunker import TextChunker, TokenChunker
 from .vectorstore import VectorStore
-from .agent import QueryAgent, QueryResult
+from .index_backends import IndexConfig
+from .llm_cache import CompletionCache
+from .agent import QueryAgent, QueryResult, StreamEvent
+from .answer_cache import SemanticAnswerCache
+from .batch import RateLimiter
+from .pipeline import IngestionPipeline
+from .metrics import JsonlTraceSink, MetricsSink, PrometheusSink, QueryTracer
+from .xbrl import FactsStore
+
+CHUNKING_MODES = ("words", "tokens")
+# Tokens shared by consecutive chunks in "tokens" chunking mode
+TOKEN_CHUNK_OVERLAP = 32
+# Answers of queries that failed; query_many keeps their records but re-runs them on resume.
+_ERROR_ANSWERS = ("Error generating answer", "Error processing query")
 
 
 class FinancialRAGSystem:
     """Main RAG system orchestrator"""
 
-    def __init__(self, groq_api_key: Optional[str] = None):
+    def __init__(self, groq_api_key: Optional[str] = None, index_dir: Optional[str] = "index_snapshots",
+                 embedding_cache_dir: Optional[str] = "embedding_cache", index_config: Optional[IndexConfig] = None,
+                 llm_cache_path: Optional[str] = "llm_cache.sqlite", chunking: str = "words",
+                 onnx_query_encoder_dir: Optional[str] = None, metrics_sinks: Optional[List[MetricsSink]] = None,
+                 trace_path: Optional[str] = None, profile_queries: Optional[str] = None,
+                 facts_store_dir: Optional[str] = "facts_store", query_cache_dir: Optional[str] = "query_cache",
+                 answer_cache_threshold: Optional[float] = 0.92):
+        if chunking not in CHUNKING_MODES:
+            raise ValueError(f"Unknown chunking mode {chunking!r}, expected one of {CHUNKING_MODES}")
+        self.index_dir = index_dir
+        self.facts_store_dir = facts_store_dir
         self.data_acquisition = SECDataAcquisition()
-        self.chunker = TextChunker()
-        self.vector_store = VectorStore()
+        # An ONNX query encoder (see rag.onnx_encoder.export_onnx) lets query-only runs skip torch;
+        # it can also be set with RAG_ONNX_QUERY_ENCODER.
+        onnx_query_encoder_dir = onnx_query_encoder_dir or os.getenv('RAG_ONNX_QUERY_ENCODER')
+        query_encoder = None
+        if onnx_query_encoder_dir:
+            from .onnx_encoder import OnnxQueryEncoder
+            query_encoder = OnnxQueryEncoder(onnx_query_encoder_dir)
+        self.vector_store = VectorStore(embedding_cache_dir=embedding_cache_dir, index_config=index_config,
+                                        query_encoder=query_encoder, query_cache_dir=query_cache_dir)
+        # "words" sizes chunks by word count; "tokens" packs them to the encoder's own token limit,
+        # so no chunk text is silently truncated at embedding time.
+        self.chunking = chunking
+        self._chunker: Optional[TextChunker] = None
 
         effective_api_key = groq_api_key or os.getenv('GROQ_API_KEY')
         if not effective_api_key:
             raise RuntimeError("GROQ_API_KEY is not set. Please export GROQ_API_KEY in your environment.")
+        from groq import AsyncGroq, Groq
         self.llm_client = Groq(api_key=effective_api_key)
+        self.async_llm_client = AsyncGroq(api_key=effective_api_key)
+
+        # Set RAG_DISABLE_LLM_CACHE=1 (or pass llm_cache_path=None) to always call the LLM.
+        cache_enabled = bool(llm_cache_path) and os.getenv('RAG_DISABLE_LLM_CACHE') != '1'
+        self.completion_cache = CompletionCache(llm_cache_path) if cache_enabled else None
+
+        # Every query's stage timings and counters feed self.metrics (Prometheus text, p50/p99 per
+        # stage); trace_path or RAG_TRACE_FILE also appends each trace to a JSONL file.
+        self.metrics = PrometheusSink()
+        sinks: List[MetricsSink] = [self.metrics, *(metrics_sinks or [])]
+        trace_path = trace_path or os.getenv('RAG_TRACE_FILE')
+        if trace_path:
+            sinks.append(JsonlTraceSink(trace_path))
+        # Rephrased questions (cosine similarity >= answer_cache_threshold) reuse earlier answers
+        # until the corpus changes; pass answer_cache_threshold=None to disable.
+        answer_cache = SemanticAnswerCache(answer_cache_threshold) if answer_cache_threshold is not None else None
+        self.agent = QueryAgent(self.vector_store, self.llm_client, async_llm_client=self.async_llm_client,
+                                completion_cache=self.completion_cache,
+                                tracer=QueryTracer(sinks, profile=profile_queries), answer_cache=answer_cache)
+
+    @property
+    def chunker(self) -> TextChunker:
+        # Token chunking needs the encoder's tokenizer, so it is built on first ingest and loading
+        # a snapshot never loads the model.
+        if self._chunker is None:
+            if self.chunking == "tokens":
+                self._chunker = TokenChunker(self.vector_store.tokenizer, max_tokens=self.vector_store.max_tokens,
+                                             overlap=TOKEN_CHUNK_OVERLAP)
+            else:
+                self._chunker = TextChunker()
+        return self._chunker
 
-        self.agent = QueryAgent(self.vector_store, self.llm_client)
+    def _chunker_config(self) -> Dict[str, Any]:
+        if self.chunking == "words":
+            return self.chunker.config()
+        # The embedding model fixes the tokenizer and token limit, so it keys the snapshot in their place.
+        return {"type": TokenChunker.__name__, "model": self.vector_store.embedding_model,
+                "overlap": TOKEN_CHUNK_OVERLAP, "content": "spans"}
 
-    def setup_system(self):
+    def _snapshot_params(self):
+        return {
+            "chunker": self._chunker_config(),
+            "companies": sorted(self.data_acquisition.COMPANY_CIKS),
+        }
+
+    def _setup_facts(self, rebuild: bool):
+        """Load the persisted XBRL facts store, or build it from downloaded companyfacts JSON"""
+        store = None
+        if self.facts_store_dir and not rebuild and (Path(self.facts_store_dir) / "facts_vocab.json").exists():
+            store = FactsStore.load(self.facts_store_dir)
+        elif self.data_acquisition.facts_dir.exists():
+            store = FactsStore.from_directory(str(self.data_acquisition.facts_dir))
+            if self.facts_store_dir and len(store):
+                store.save(self.facts_store_dir)
+        if store is not None and len(store):
+            print(f"XBRL facts store: {len(store)} facts for {', '.join(store.companies)}")
+            self.agent.facts_store = store
+            # Cached answers may predate facts that now answer the question directly.
+            if self.agent.answer_cache is not None:
+                self.agent.answer_cache.clear()
+        else:
+            print("No XBRL company facts available; numeric questions use the text path")
+
+    def setup_system(self, rebuild: bool = False, report_truncation: bool = False):
+        """Load the index snapshot, or ingest every filing; `report_truncation` also measures how
+        much chunk text the encoder truncates, which loads and runs its tokenizer on every chunk"""
         print("=== Setting up Financial RAG System ===")
-        print("\n1. Acquiring SEC filing data...")
-        company_data = self.data_acquisition.acquire_all_data()
-
-        print("\n2. Processing and chunking documents...")
-        all_documents = []
-        for company, years_data in company_data.items():
-            for year, text in years_data.items():
-                if text:
-                    chunks = self.chunker.chunk_text(text, company, year, f"{company}_{year}_10K")
-                    all_documents.extend(chunks)
-                    print(f"Created {len(chunks)} chunks for {company} {year}")
-
-        print(f"\n3. Building vector store with {len(all_documents)} documents...")
-        self.vector_store.add_documents(all_documents)
+        if self.index_dir and not rebuild:
+            if self.vector_store.load(self.index_dir, self._snapshot_params()):
+                self._setup_facts(rebuild=False)
+                print("✅ System setup complete (loaded from snapshot)!")
+                return
+
+        print("\n1. Ingesting filings (download → extract → chunk → embed → index)...")
+        pipeline = IngestionPipeline(self.data_acquisition, self.chunker, self.vector_store,
+                                     extract_processes=self.data_acquisition.extract_processes,
+                                     report_truncation=report_truncation)
+        pipeline.run()
+        print(pipeline.format_stats())
+        if self.vector_store.embedding_cache is not None:
+            self.vector_store.embedding_cache.save()
+            print(f"Embedding cache stats: {self.vector_store.embedding_cache.stats()}")
+        if self.index_dir:
+            self.vector_store.save(self.index_dir, self._snapshot_params())
+        # Ingestion re-downloaded the companyfacts JSON, so the facts store is rebuilt from it.
+        self._setup_facts(rebuild=True)
         print("✅ System setup complete!")
 
     def query(self, question: str) -> QueryResult:
         return self.agent.process_query(question)
 
-    def run_sample_queries(self):
+    def query_stream(self, question: str) -> Iterator[StreamEvent]:
+        """Yield sources, then answer tokens, then the final QueryResult (see QueryAgent.stream_query)"""
+        return self.agent.stream_query(question)
+
+    async def aquery(self, question: str) -> QueryResult:
+        return await self.agent.aprocess_query(question)
+
+    def query_many(self, queries: List[str], max_concurrency: int = 4, output_path: Optional[str] = None,
+                   requests_per_minute: float = 30, tokens_per_minute: Optional[float] = 6000,
+                   max_retries: int = 3) -> List[QueryResult]:
+        """Answer many queries concurrently, returning results in input order.
+
+        LLM calls share a token-bucket limit on requests and tokens per minute and are retried
+        with backoff; these limits apply to this batch's calls only. When output_path is given,
+        each result is appended to it as a JSONL record as soon as it completes, and successful
+        records already present are reused, so an interrupted run resumes where it stopped and
+        retries the queries that failed.
+        """
+        results: Dict[int, QueryResult] = {}
+        if output_path and Path(output_path).exists():
+            with open(output_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a line cut short by an interruption
+                    index = record.pop('index', None)
+                    if (isinstance(index, int) and 0 <= index < len(queries) and record.get('query') == queries[index]
+                            and not str(record.get('answer', '')).startswith(_ERROR_ANSWERS)):
+                        results[index] = QueryResult(**record)
+            if results:
+                print(f"Resuming: {len(results)} of {len(queries)} queries already answered in {output_path}")
+
+        pending = [i for i in range(len(queries)) if i not in results]
+        limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        write_lock = threading.Lock()
+        output = open(output_path, 'a', encoding='utf-8') if output_path else None
+        try:
+            with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="query") as pool:
+                futures = {pool.submit(self.agent.process_query, queries[i], rate_limiter=limiter,
+                                       max_retries=max_retries): i for i in pending}
+                for future in as_completed(futures):
+                    index = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"Query failed: {queries[index]}: {e}")
+                        result = QueryResult(query=queries[index], answer=f"Error processing query: {e}",
+                                             reasoning="Error in query pipeline", sub_queries=[queries[index]],
+                                             sources=[])
+                    results[index] = result
+                    if output is not None:
+                        with write_lock:
+                            output.write(json.dumps({'index': index, **asdict(result)}) + '\n')
+                            output.flush()
+        finally:
+            if output is not None:
+                output.close()
+            if self.vector_store.query_cache is not None:
+                self.vector_store.query_cache.save()
+        return [results[i] for i in range(len(queries))]
+
+    def close(self):
+        """Persist the query embedding cache and release the LLM cache and HTTP connections"""
+        if self.vector_store.query_cache is not None:
+            self.vector_store.query_cache.save()
+        if self.completion_cache is not None:
+            self.completion_cache.close()
+        self.data_acquisition.close()
+
+    def run_sample_queries(self, output_path: Optional[str] = None, max_concurrency: int = 4):
         test_queries = [
             "What was NVIDIA's total revenue in fiscal year 2024?",
             "What percentage of Google's 2023 revenue came from advertising?",
@@ -53,16 +231,22 @@ class FinancialRAGSystem:
             "Compare the R&D spending as a percentage of revenue across all three companies in 2023",
         ]
 
-        results = []
-        for query in test_queries:
-            result = self.query(query)
-            results.append(result)
+        results = self.query_many(test_queries, max_concurrency=max_concurrency, output_path=output_path)
+        for result in results:
             print(f"\n{'='*50}")
             print(f"Query: {result.query}")
             print(f"Answer: {result.answer}")
             print(f"Reasoning: {result.reasoning}")
             print(f"Sub-queries: {result.sub_queries}")
             print(f"Sources: {len(result.sources)} documents")
+        if self.completion_cache is not None:
+            print(f"\nLLM completion cache: {self.completion_cache.stats()}")
+        if self.vector_store.query_cache is not None:
+            print(f"Query embedding cache: {self.vector_store.query_cache.stats()}")
+        if self.agent.answer_cache is not None:
+            print(f"Semantic answer cache: {self.agent.answer_cache.stats()}")
+        planner = self.agent.planner.stats()
+        print(f"Query planner: {planner['planned']} decompositions planned locally, "
+              f"{planner['llm_fallbacks']} sent to the LLM (hit rate {planner['hit_rate']:.0%})")
+        print(self.metrics.format_summary())
         return results
-
-
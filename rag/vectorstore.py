@@ -1,61 +1,504 @@
-from typing import List, Optional, Tuple
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import weakref
 import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer
 
-from .chunker import Document
+from .chunker import Document, truncation_report
+from .docstore import METADATA_FIELDS, DocumentStore
+from .embedding_cache import EmbeddingCache
+from .lexical import BM25Index, reciprocal_rank_fusion
+from .metrics import span
+from .query_cache import QueryEmbeddingCache
+from .lazy_import import LazyModule
+from .index_backends import (
+    IndexConfig, build_index, format_recall_report, is_compressed, recall_report, rescore, search_parameters,
+    supports_removal, train_index,
+)
+
+faiss = LazyModule("faiss")
+
+SNAPSHOT_FORMAT_VERSION = 6
+
+SEARCH_MODES = ("dense", "lexical", "hybrid")
+HYBRID_DEPTH_FACTOR = 4
+EMPTY_HITS = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+
+Filters = Optional[Dict[str, str]]
 
 
 class VectorStore:
     """Vector storage and retrieval using FAISS"""
 
-    def __init__(self, embedding_model: str = "all-MiniLM-L6-v2"):
-        self.encoder = SentenceTransformer(embedding_model)
-        self.documents: List[Document] = []
+    def __init__(self, embedding_model: str = "all-MiniLM-L6-v2", embedding_cache_dir: Optional[str] = None,
+                 index_config: Optional[IndexConfig] = None, vector_dir: Optional[str] = None,
+                 query_encoder: Optional[Any] = None, query_cache_size: int = 4096,
+                 query_cache_dir: Optional[str] = None):
+        self.embedding_model = embedding_model
+        self.index_config = index_config or IndexConfig()
+        # Type and vector storage of the live index; they stay "flat"/"float32" until the
+        # corpus reaches index_config.min_corpus_size.
+        self.index_type = "flat"
+        self.index_storage = "float32"
+        # Full-precision vectors live in a disk-backed memmap under vector_dir (a temporary
+        # directory by default) rather than as a second in-RAM copy next to the index.
+        self.vector_dir = vector_dir
+        self._spill_path: Optional[Path] = None
+        self._spill_count = 0
+        self.index_report: Optional[Dict[str, Any]] = None
+        # The SentenceTransformer is loaded on first encode (see `encoder`), so loading a snapshot
+        # or answering from caches never pays for torch. `query_encoder`, when given, embeds search
+        # queries instead, e.g. an OnnxQueryEncoder for short-lived CLI processes.
+        self._encoder = None
+        self.query_encoder = query_encoder
+        self.embedding_cache = EmbeddingCache(embedding_cache_dir, embedding_model) if embedding_cache_dir else None
+        # Sub-queries repeat across users, so their embeddings are kept in an LRU (0 disables it).
+        # Keyed by the encoder that embeds queries, so torch and ONNX embeddings never mix.
+        query_model = (embedding_model if query_encoder is None
+                       else f"{embedding_model}+{getattr(query_encoder, 'name', type(query_encoder).__name__)}")
+        self.query_cache = (QueryEmbeddingCache(query_model, query_cache_size, query_cache_dir)
+                            if query_cache_size else None)
+        # Slot i holds the document whose vector has FAISS id i; removed slots read as None.
+        self.documents = DocumentStore()
         self.index: Optional[faiss.Index] = None
-        self.embeddings: Optional[np.ndarray] = None
+        self._buffer: Optional[np.ndarray] = None
+        self._size = 0
+        self._index_read_only = False
+        # Bumped whenever the searchable corpus changes, so results derived from it can be invalidated.
+        self.version = 0
+        # Packed filter bitmaps derived from the document store's metadata columns
+        self._filter_bitmaps: Dict[Tuple[Tuple[str, str], ...], Tuple[np.ndarray, int]] = {}
+        self.lexical_index = BM25Index()
+
+    def __len__(self) -> int:
+        return self.documents.live
+
+    @property
+    def encoder(self) -> Any:
+        if self._encoder is None:
+            from sentence_transformers import SentenceTransformer
+            self._encoder = SentenceTransformer(self.embedding_model)
+        return self._encoder
+
+    @property
+    def tokenizer(self) -> Any:
+        return self.encoder.tokenizer
+
+    @property
+    def max_tokens(self) -> int:
+        """Longest input, in tokens excluding special tokens, the encoder embeds without truncation"""
+        return self.encoder.max_seq_length - self.tokenizer.num_special_tokens_to_add()
+
+    def truncation_report(self, documents: List[Document]) -> Dict[str, Any]:
+        return truncation_report([doc.content for doc in documents], self.tokenizer, self.max_tokens)
+
+    @property
+    def embeddings(self) -> Optional[np.ndarray]:
+        """Normalized embeddings for every slot, including removed ones"""
+        if self._buffer is None:
+            return None
+        return self._buffer[:self._size]
+
+    def _reserve(self, extra: int, dimension: int):
+        needed = self._size + extra
+        if self._buffer is not None and needed <= self._buffer.shape[0] and self._buffer.flags.writeable:
+            return
+        capacity = max(needed, 2 * (self._buffer.shape[0] if self._buffer is not None else 0), 1024)
+        if self.vector_dir is None:
+            self.vector_dir = tempfile.mkdtemp(prefix="rag_vectors_")
+            weakref.finalize(self, shutil.rmtree, self.vector_dir, True)
+        Path(self.vector_dir).mkdir(parents=True, exist_ok=True)
+        self._spill_count += 1
+        path = Path(self.vector_dir) / f"vectors-{os.getpid()}-{id(self):x}-{self._spill_count}.f32"
+        buffer = np.memmap(path, dtype=np.float32, mode="w+", shape=(capacity, dimension))
+        for start in range(0, self._size, 1 << 16):
+            end = min(start + (1 << 16), self._size)
+            buffer[start:end] = self._buffer[start:end]
+        previous = self._spill_path
+        self._buffer = buffer
+        self._spill_path = path
+        if previous is not None:
+            previous.unlink(missing_ok=True)
 
-    def add_documents(self, documents: List[Document]):
+    def _writable_index(self, dimension: int) -> "faiss.Index":
+        if self.index is None:
+            self.index = build_index(self.index_config, "flat", dimension, 0)
+        elif self._index_read_only:
+            # clone_index keeps pointing at memory-mapped codes, so round-trip through bytes instead.
+            self.index = faiss.deserialize_index(faiss.serialize_index(self.index))
+            self._index_read_only = False
+        return self.index
+
+    def encode_documents(self, texts: List[str], verbose: bool = True) -> np.ndarray:
+        """Normalized embeddings for chunk texts, going through the embedding cache when configured"""
+        if self.embedding_cache is not None:
+            hits, misses = self.embedding_cache.hits, self.embedding_cache.misses
+            # Only cache misses need the model, so a fully cached batch never loads it.
+            embeddings = self.embedding_cache.encode(texts, lambda batch: self.encoder.encode(batch))
+            if verbose:
+                print(f"Embedding cache: {self.embedding_cache.hits - hits} hits, "
+                      f"{self.embedding_cache.misses - misses} misses")
+        else:
+            embeddings = np.asarray(self.encoder.encode(texts), dtype=np.float32)
+        if len(embeddings.shape) == 1:
+            embeddings = embeddings.reshape(1, -1)
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        faiss.normalize_L2(embeddings)
+        return embeddings
+
+    def add_documents(self, documents: List[Document], embeddings: Optional[np.ndarray] = None,
+                      verbose: bool = True):
+        """Add chunks to the store; `embeddings` may carry their precomputed encode_documents output"""
         if not documents:
             print("⚠️ No documents to add to vector store")
             return
 
-        self.documents.extend(documents)
+        superseded = [doc.chunk_id for doc in documents if self.documents.slot_of(doc.chunk_id) is not None]
+        if superseded:
+            self.remove_documents(superseded)
 
         texts = [doc.content for doc in documents]
-        new_embeddings = self.encoder.encode(texts)
-        if len(new_embeddings.shape) == 1:
-            new_embeddings = new_embeddings.reshape(1, -1)
+        new_embeddings = embeddings if embeddings is not None else self.encode_documents(texts, verbose)
+
+        count, dimension = new_embeddings.shape
+        self._reserve(count, dimension)
+        start = self._size
+        self._buffer[start:start + count] = new_embeddings
+        self._size += count
+
+        self.documents.add(documents)
+        self.version += 1
+        self._filter_bitmaps.clear()
+        self.lexical_index.add(list(range(start, start + count)), texts)
 
-        if self.embeddings is None:
-            self.embeddings = new_embeddings
+        if (self.index_config.effective_type(len(self)), self.index_config.effective_storage(len(self))) != \
+                (self.index_type, self.index_storage):
+            self.rebuild_index()
         else:
-            self.embeddings = np.vstack([self.embeddings, new_embeddings])
+            ids = np.arange(start, start + count, dtype=np.int64)
+            self._writable_index(dimension).add_with_ids(new_embeddings, ids)
 
-        dimension = self.embeddings.shape[1]
-        self.index = faiss.IndexFlatIP(dimension)
-        faiss.normalize_L2(self.embeddings)
-        self.index.add(self.embeddings)
+        if verbose:
+            print(f"Added {len(documents)} documents to vector store. Total: {len(self)}")
 
-        print(f"Added {len(documents)} documents to vector store. Total: {len(self.documents)}")
+    def remove_documents(self, chunk_ids: List[str]) -> int:
+        """Remove chunks by chunk_id, e.g. when a filing is superseded; returns the number removed"""
+        slots = [slot for slot in map(self.documents.slot_of, chunk_ids) if slot is not None]
+        return self._remove_slots(slots)
 
-    def search(self, query: str, k: int = 5, company_filter: Optional[str] = None) -> List[Tuple[Document, float]]:
-        if self.index is None:
+    def _remove_slots(self, slots: List[int]) -> int:
+        if not slots or self.index is None:
+            return 0
+        ids = np.asarray(slots, dtype=np.int64)
+        self.documents.remove(slots)
+        self.version += 1
+        self._filter_bitmaps.clear()
+        self.lexical_index.remove(slots)
+        if supports_removal(self.index_type):
+            self._writable_index(self._buffer.shape[1]).remove_ids(ids)
+        else:
+            self.rebuild_index()
+        return len(slots)
+
+    def rebuild_index(self, queries: Optional[np.ndarray] = None):
+        """Rebuild the index from the stored vectors using the configured index type.
+
+        Approximate indexes are trained on a sample of the corpus and a recall@k report
+        against the flat baseline is stored in `index_report`.
+        """
+        if self._buffer is None:
+            return
+        index_type = self.index_config.effective_type(len(self))
+        storage = self.index_config.effective_storage(len(self))
+        live = self.documents.live_slots()
+        index = build_index(self.index_config, index_type, self._buffer.shape[1], len(live), storage)
+        if len(live):
+            train_index(index, self.index_config, self._buffer[live])
+            for start in range(0, len(live), 1 << 16):
+                block = live[start:start + (1 << 16)]
+                index.add_with_ids(np.ascontiguousarray(self._buffer[block]), block)
+
+        self.index = index
+        self.index_type = index_type
+        self.index_storage = storage
+        self._index_read_only = False
+        if (index_type != "flat" or is_compressed(index_type, storage)) and len(live):
+            self.index_report = recall_report(index, self.index_config, index_type, self._buffer[live], live,
+                                              queries=queries, storage=storage)
+            print(format_recall_report(self.index_report))
+
+    def remove_source(self, source: str) -> int:
+        """Remove every chunk that came from the given source filing"""
+        return self._remove_slots(self.documents.slots_where("source", source).tolist())
+
+    def encode_query(self, query: str) -> np.ndarray:
+        """L2-normalized embedding of a search query, through the query embedding cache"""
+        return self._encode_queries([query])[0]
+
+    def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        if self.query_cache is None:
+            return self._encode_uncached(queries)
+        return self.query_cache.encode(queries, self._encode_uncached)
+
+    def _encode_uncached(self, queries: List[str]) -> np.ndarray:
+        encoder = self.query_encoder if self.query_encoder is not None else self.encoder
+        with span("encode"):
+            query_embeddings = np.ascontiguousarray(encoder.encode(queries), dtype=np.float32)
+        if query_embeddings.ndim == 1:
+            query_embeddings = query_embeddings.reshape(1, -1)
+        faiss.normalize_L2(query_embeddings)
+        return query_embeddings
+
+    def _filter_selector(self, filters: Dict[str, str]) -> Optional[Tuple[np.ndarray, int]]:
+        """Packed bitmap over slots matching every filter, and the number of matches"""
+        key = tuple(sorted(filters.items()))
+        cached = self._filter_bitmaps.get(key)
+        if cached is not None:
+            return cached
+        mask = np.ones(self._size, dtype=bool)
+        for field, value in filters.items():
+            if field not in METADATA_FIELDS:
+                raise ValueError(f"Unsupported filter field: {field}")
+            code = self.documents.code_of(field, value)
+            if code is None:
+                mask[:] = False
+                break
+            mask &= self.documents.codes[field][:self._size] == code
+        entry = (np.packbits(mask, bitorder="little"), int(mask.sum()))
+        self._filter_bitmaps[key] = entry
+        return entry
+
+    def search(self, query: str, k: int = 5, company_filter: Optional[str] = None,
+               year_filter: Optional[str] = None, source_filter: Optional[str] = None,
+               mode: str = "dense") -> List[Tuple[Document, float]]:
+        filters = {field: value for field, value in
+                   (("company", company_filter), ("year", year_filter), ("source", source_filter)) if value}
+        return self.search_batch([query], k=k, filters=filters or None, mode=mode)[0]
+
+    def search_batch(self, queries: List[str], k: int = 5, filters: Union[Filters, List[Filters]] = None,
+                     nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                     mode: str = "dense") -> List[List[Tuple[Document, float]]]:
+        """Search several queries with one encoder pass; results are in query order.
+
+        `filters` maps metadata fields (company, year, source) to required values, either once
+        for all queries or as a list with one entry per query. Filters are applied inside the
+        FAISS search. On the flat index each query gets k hits whenever k matching chunks exist;
+        IVF/HNSW traversal can miss filtered chunks, so there a filter matching at most
+        `IndexConfig.exact_filter_limit` chunks, or a search that comes back short, is answered
+        by an exact scan of the matching chunks' vectors instead.
+        `nprobe`/`ef_search` override the configured IVF/HNSW search breadth for this call only.
+        `mode` is "dense", "lexical" (BM25) or "hybrid" (reciprocal-rank fusion of both).
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode {mode!r}, expected one of {SEARCH_MODES}")
+        if not queries:
             return []
+        if self.index is None or len(self) == 0:
+            return [[] for _ in queries]
+
+        per_query = filters if isinstance(filters, list) else [filters] * len(queries)
+        # Hybrid search fuses deeper candidate lists than the k hits it returns.
+        depth = max(k * HYBRID_DEPTH_FACTOR, k) if mode == "hybrid" else k
+
+        dense: List[Tuple[np.ndarray, np.ndarray]] = [EMPTY_HITS] * len(queries)
+        if mode != "lexical":
+            dense = self._dense_search(queries, per_query, depth, nprobe, ef_search)
+
+        all_results: List[List[Tuple[Document, float]]] = []
+        for position, query in enumerate(queries):
+            slots, scores = dense[position]
+            if mode != "dense":
+                mask = None
+                if per_query[position]:
+                    bitmap, _ = self._filter_selector(per_query[position])
+                    mask = np.unpackbits(bitmap, count=self._size, bitorder="little").astype(bool)
+                with span("lexical_search"):
+                    lexical_slots, lexical_scores = self.lexical_index.search(query, depth, mask)
+                if mode == "lexical":
+                    slots, scores = lexical_slots, lexical_scores
+                else:
+                    slots, scores = reciprocal_rank_fusion([slots, lexical_slots], k)
+            # Only the returned hits are materialized as Document objects.
+            hits = [(self.documents[slot], float(score)) for slot, score in zip(slots[:k].tolist(), scores[:k].tolist())]
+            all_results.append([(doc, score) for doc, score in hits if doc is not None])
+        return all_results
+
+    def _dense_search(self, queries: List[str], per_query: List[Filters], k: int,
+                      nprobe: Optional[int], ef_search: Optional[int]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        query_embeddings = self._encode_queries(queries)
 
-        query_embedding = self.encoder.encode([query])
-        faiss.normalize_L2(query_embedding)
-        scores, indices = self.index.search(query_embedding, min(k * 2, len(self.documents)))
+        # Queries sharing a filter are searched together in one FAISS call.
+        groups: Dict[Tuple[Tuple[str, str], ...], List[int]] = {}
+        for position, query_filters in enumerate(per_query):
+            groups.setdefault(tuple(sorted((query_filters or {}).items())), []).append(position)
 
-        results: List[Tuple[Document, float]] = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx < len(self.documents):
-                doc = self.documents[idx]
-                if company_filter and doc.company != company_filter:
+        # Compressed codes only shortlist candidates; the final order comes from the full vectors.
+        compressed = is_compressed(self.index_type, self.index_storage)
+        depth = k * self.index_config.rescore_factor if compressed else k
+
+        hits: List[Tuple[np.ndarray, np.ndarray]] = [EMPTY_HITS] * len(queries)
+        for key, positions in groups.items():
+            selector = None
+            available = len(self)
+            if key:
+                bitmap, available = self._filter_selector(dict(key))
+                if available == 0:
                     continue
-                results.append((doc, float(score)))
-                if len(results) >= k:
-                    break
-        return results
+                selector = faiss.IDSelectorBitmap(self._size, faiss.swig_ptr(bitmap))
+            approximate_filter = selector is not None and self.index_type != "flat"
+            if approximate_filter and available <= self.index_config.exact_filter_limit:
+                with span("dense_search"):
+                    scores, indices = self._exact_search(query_embeddings[positions], bitmap, min(k, available))
+            else:
+                params = search_parameters(self.index_config, self.index_type, selector, nprobe=nprobe,
+                                           ef_search=ef_search, storage=self.index_storage)
+                with span("dense_search"):
+                    scores, indices = self.index.search(query_embeddings[positions], min(depth, available),
+                                                        params=params)
+                if compressed:
+                    with span("rescore"):
+                        scores, indices = rescore(query_embeddings[positions], indices, self._buffer,
+                                                  min(k, available))
+                if approximate_filter and (indices[:, :min(k, available)] < 0).any():
+                    with span("dense_search"):
+                        scores, indices = self._exact_search(query_embeddings[positions], bitmap, min(k, available))
+            for position, row_scores, row_indices in zip(positions, scores, indices):
+                valid = row_indices >= 0
+                hits[position] = (row_indices[valid], row_scores[valid])
+        return hits
+
+    def _exact_search(self, queries: np.ndarray, bitmap: np.ndarray, k: int,
+                      block_size: int = 1 << 16) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact top-k over the slots set in a filter bitmap, shaped like `index.search` output"""
+        slots = np.flatnonzero(np.unpackbits(bitmap, count=self._size, bitorder="little"))
+        scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        ids = np.empty((len(queries), 0), dtype=np.int64)
+        # Blocks bound the memory of the gathered vectors; each keeps only its running top k.
+        for start in range(0, len(slots), block_size):
+            block = slots[start:start + block_size]
+            block_scores = queries @ np.asarray(self._buffer[block], dtype=np.float32).T
+            scores = np.concatenate([scores, block_scores], axis=1)
+            ids = np.concatenate([ids, np.broadcast_to(block, block_scores.shape)], axis=1)
+            top = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+            scores, ids = np.take_along_axis(scores, top, axis=1), np.take_along_axis(ids, top, axis=1)
+        return scores, ids
+
+    def snapshot_key(self, build_params: Dict[str, Any]) -> str:
+        """Stable key for a snapshot built with this model and the given build parameters"""
+        payload = json.dumps({
+            "format": SNAPSHOT_FORMAT_VERSION,
+            "embedding_model": self.embedding_model,
+            "index_config": asdict(self.index_config),
+            "build_params": build_params,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def save(self, snapshot_dir: str, build_params: Dict[str, Any]) -> Optional[Path]:
+        """Write index, embeddings and document metadata under snapshot_dir/<key>"""
+        if self.index is None or self.embeddings is None:
+            print("⚠️ Vector store is empty, not writing a snapshot")
+            return None
+
+        key = self.snapshot_key(build_params)
+        root = Path(snapshot_dir)
+        root.mkdir(parents=True, exist_ok=True)
+        target = root / key
+        staging = root / f"{key}.tmp-{os.getpid()}"
+        if staging.exists():
+            shutil.rmtree(staging)
+        staging.mkdir()
+
+        np.save(staging / "embeddings.npy", np.ascontiguousarray(self.embeddings, dtype=np.float32))
+        faiss.write_index(self.index, str(staging / "index.faiss"))
+        self.documents.save(staging)
+        lexical = self.lexical_index.to_arrays()
+        with open(staging / "lexical_terms.json", "w", encoding="utf-8") as f:
+            json.dump(lexical.pop("terms"), f)
+        np.savez(staging / "lexical.npz", **lexical)
+        manifest = {
+            "format": SNAPSHOT_FORMAT_VERSION,
+            "key": key,
+            "embedding_model": self.embedding_model,
+            "build_params": build_params,
+            "num_documents": len(self),
+            "num_slots": self._size,
+            "index_type": self.index_type,
+            "storage": self.index_storage,
+            "dimension": int(self.embeddings.shape[1]),
+        }
+        # The manifest is written last so a half-written snapshot never validates.
+        with open(staging / "manifest.json", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+        if target.exists():
+            shutil.rmtree(target)
+        os.replace(staging, target)
+        print(f"Saved vector store snapshot: {target}")
+        return target
+
+    def load(self, snapshot_dir: str, build_params: Dict[str, Any]) -> bool:
+        """Load a snapshot matching this model and build parameters; returns False if none is valid"""
+        key = self.snapshot_key(build_params)
+        path = Path(snapshot_dir) / key
+        manifest_path = path / "manifest.json"
+        if not manifest_path.exists():
+            return False
+
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if (manifest.get("format") != SNAPSHOT_FORMAT_VERSION
+                    or manifest.get("embedding_model") != self.embedding_model
+                    or manifest.get("build_params") != json.loads(json.dumps(build_params))):
+                print(f"Snapshot {path} does not match current settings, ignoring")
+                return False
+
+            embeddings = np.load(path / "embeddings.npy", mmap_mode="r")
+            documents = DocumentStore.load(path)
+            index = self._read_index(path / "index.faiss")
+            with open(path / "lexical_terms.json", "r", encoding="utf-8") as f:
+                lexical = {"terms": json.load(f)}
+            with np.load(path / "lexical.npz") as arrays:
+                lexical.update({name: arrays[name] for name in arrays.files})
+            lexical_index = BM25Index.from_arrays(lexical)
+
+            live = documents.live
+            if not (len(documents) == embeddings.shape[0] == manifest["num_slots"]
+                    and live == index.ntotal == manifest["num_documents"]):
+                print(f"Snapshot {path} is inconsistent, ignoring")
+                return False
+        except Exception as e:
+            print(f"Error loading snapshot {path}: {e}")
+            return False
 
+        self.documents = documents
+        if self._spill_path is not None:
+            self._spill_path.unlink(missing_ok=True)
+            self._spill_path = None
+        self._buffer = embeddings
+        self._size = embeddings.shape[0]
+        self.version += 1
+        self._filter_bitmaps.clear()
+        self.index = index
+        self.lexical_index = lexical_index
+        self.index_type = manifest["index_type"]
+        self.index_storage = manifest.get("storage", "float32")
+        # The loaded index may be memory-mapped read-only; it is copied on first write.
+        self._index_read_only = True
+        print(f"Loaded vector store snapshot with {live} documents from {path}")
+        return True
 
+    @staticmethod
+    def _read_index(path: Path) -> "faiss.Index":
+        # Memory-mapping lets several worker processes share the same pages;
+        # not every index type supports it, so fall back to a regular read.
+        try:
+            mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+            return faiss.read_index(str(path), mmap_flag | faiss.IO_FLAG_READ_ONLY)
+        except Exception:
+            return faiss.read_index(str(path))
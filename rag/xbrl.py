@@ -0,0 +1,347 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import datetime
+import json
+import numpy as np
+
+from .lexicon import (
+    ADJUSTMENT_MATCHER, COMPANY_MATCHER, COMPARE_MATCHER, GROWTH_MATCHER, METRIC_MATCHER, METRICS, QUALIFIED_MATCHER,
+    QUALITATIVE_MATCHER, RANK_MATCHER, RANK_TERMS, SEGMENT_MATCHER, SHARE_MATCHER, Metric, PhraseMatcher, company_name,
+    find_companies, find_years, unmatched_words,
+)
+
+ANNUAL_FORMS = ("10-K", "10-K/A", "20-F", "40-F")
+TAXONOMY = "us-gaap"
+VOCAB_FIELDS = ("concept", "company", "unit", "accession")
+FACT_KINDS = ("lookup", "compare", "rank", "growth")
+_EPOCH = datetime.date(1970, 1, 1)
+
+
+def _days(date: str) -> int:
+    return (datetime.date.fromisoformat(date) - _EPOCH).days
+
+
+def _key(concept: np.ndarray, company: np.ndarray, year: np.ndarray) -> np.ndarray:
+    return (concept.astype(np.int64) << 32) | (company.astype(np.int64) << 16) | year.astype(np.int64)
+
+
+def parse_companyfacts(data: Dict[str, Any], taxonomy: str = TAXONOMY) -> List[Tuple[str, int, float, str, str, int]]:
+    """Annual facts of an EDGAR companyfacts document as (concept, fiscal year, value, unit, accession, filed day)"""
+    candidates = []
+    # The latest period end in each filing is that filing's own fiscal year end.
+    period_end: Dict[str, int] = {}
+    for concept, fact in data.get("facts", {}).get(taxonomy, {}).items():
+        # Concepts are reported in a single unit in practice; keep the first.
+        for unit, entries in list(fact.get("units", {}).items())[:1]:
+            for entry in entries:
+                if entry.get("form") not in ANNUAL_FORMS or entry.get("fp") != "FY" or not entry.get("fy"):
+                    continue
+                end = _days(entry["end"])
+                if "start" in entry and not 300 <= end - _days(entry["start"]) <= 400:
+                    continue  # quarterly or cumulative durations repeated in the annual report
+                candidates.append((concept, unit, entry, end))
+                period_end[entry["accn"]] = max(period_end.get(entry["accn"], end), end)
+
+    rows = []
+    for concept, unit, entry, end in candidates:
+        # `fy` is the filing's fiscal year; comparative prior-year columns are shifted back accordingly.
+        year = int(entry["fy"]) - round((period_end[entry["accn"]] - end) / 365.25)
+        rows.append((concept, year, float(entry["val"]), unit, entry["accn"], _days(entry.get("filed", entry["end"]))))
+    return rows
+
+
+class FactsStore:
+    """Columnar store of annual XBRL facts, one row per (concept, company, fiscal year).
+
+    Concept, company, unit and accession are dictionary-encoded; rows are sorted by a packed
+    (concept, company, year) key, so any block of cells is fetched with one vectorized
+    searchsorted. When a value is restated, the latest filing wins.
+    """
+
+    def __init__(self):
+        self.vocab: Dict[str, List[str]] = {field: [] for field in VOCAB_FIELDS}
+        self._code_of: Dict[str, Dict[str, int]] = {field: {} for field in VOCAB_FIELDS}
+        self.columns: Dict[str, np.ndarray] = {
+            "concept": np.empty(0, dtype=np.int32),
+            "company": np.empty(0, dtype=np.int32),
+            "year": np.empty(0, dtype=np.int16),
+            "value": np.empty(0, dtype=np.float64),
+            "unit": np.empty(0, dtype=np.int32),
+            "accession": np.empty(0, dtype=np.int32),
+            "filed": np.empty(0, dtype=np.int32),
+        }
+        self._keys = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def companies(self) -> List[str]:
+        return list(self.vocab["company"])
+
+    def _code(self, field: str, value: str) -> int:
+        code = self._code_of[field].get(value)
+        if code is None:
+            code = self._code_of[field][value] = len(self.vocab[field])
+            self.vocab[field].append(value)
+        return code
+
+    def add_companyfacts(self, company: str, data: Dict[str, Any]) -> int:
+        """Add the annual facts of one companyfacts document; returns the number of facts read"""
+        rows = parse_companyfacts(data)
+        if not rows:
+            return 0
+        company_code = self._code("company", company)
+        new = {
+            "concept": np.array([self._code("concept", row[0]) for row in rows], dtype=np.int32),
+            "company": np.full(len(rows), company_code, dtype=np.int32),
+            "year": np.array([row[1] for row in rows], dtype=np.int16),
+            "value": np.array([row[2] for row in rows], dtype=np.float64),
+            "unit": np.array([self._code("unit", row[3]) for row in rows], dtype=np.int32),
+            "accession": np.array([self._code("accession", row[4]) for row in rows], dtype=np.int32),
+            "filed": np.array([row[5] for row in rows], dtype=np.int32),
+        }
+        merged = {name: np.concatenate([self.columns[name], new[name]]) for name in self.columns}
+        keys = _key(merged["concept"], merged["company"], merged["year"])
+        # Sort by key, latest filing first, and keep the first row of every key.
+        order = np.lexsort((-merged["filed"].astype(np.int64), keys))
+        keys = keys[order]
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        self.columns = {name: column[order[first]] for name, column in merged.items()}
+        self._keys = keys[first]
+        return len(rows)
+
+    @classmethod
+    def from_directory(cls, directory: str) -> "FactsStore":
+        """Build a store from companyfacts JSON files named after their ticker, e.g. NVDA.json"""
+        store = cls()
+        for path in sorted(Path(directory).glob("*.json")):
+            with open(path, "r", encoding="utf-8") as f:
+                store.add_companyfacts(path.stem, json.load(f))
+        return store
+
+    def lookup(self, concepts: Sequence[str], companies: Sequence[str],
+               years: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Values and row numbers shaped (concepts, companies, years); NaN / -1 where nothing is reported"""
+        concept_codes = np.array([self._code_of["concept"].get(c, -1) for c in concepts], dtype=np.int64)
+        company_codes = np.array([self._code_of["company"].get(c, -1) for c in companies], dtype=np.int64)
+        year_values = np.asarray(years, dtype=np.int64)
+        keys = _key(concept_codes[:, None, None], company_codes[None, :, None], year_values[None, None, :])
+        known = (concept_codes[:, None, None] >= 0) & (company_codes[None, :, None] >= 0)
+        positions = np.minimum(np.searchsorted(self._keys, keys), max(len(self._keys) - 1, 0))
+        found = known & (self._keys[positions] == keys) if len(self._keys) else np.zeros(keys.shape, dtype=bool)
+        values = np.full(keys.shape, np.nan)
+        values[found] = self.columns["value"][positions[found]]
+        rows = np.where(found, positions, -1)
+        return values, rows
+
+    def metric_values(self, metric: Metric, companies: Sequence[str],
+                      years: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """(companies, years) values of a metric, and the fact rows it was computed from"""
+        if metric.ratio is not None:
+            numerator, numerator_rows = self.metric_values(METRICS[metric.ratio[0]], companies, years)
+            denominator, denominator_rows = self.metric_values(METRICS[metric.ratio[1]], companies, years)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values = np.where(denominator != 0, numerator / denominator, np.nan)
+            return values, np.concatenate([numerator_rows, denominator_rows])
+
+        shape = (len(companies), len(years))
+        values, used = np.full(shape, np.nan), np.full(shape, -1, dtype=np.int64)
+        if metric.concepts:
+            candidates, rows = self.lookup(metric.concepts, companies, years)
+            # First reported concept per cell.
+            first = np.argmax(~np.isnan(candidates), axis=0)[None]
+            values = np.take_along_axis(candidates, first, axis=0)[0]
+            used = np.take_along_axis(rows, first, axis=0)[0]
+        used_rows = used[used >= 0]
+        missing = np.isnan(values)
+        if metric.difference is not None and missing.any():
+            minuend, minuend_rows = self.metric_values(METRICS[metric.difference[0]], companies, years)
+            subtrahend, subtrahend_rows = self.metric_values(METRICS[metric.difference[1]], companies, years)
+            values = np.where(missing, minuend - subtrahend, values)
+            used_rows = np.concatenate([used_rows, minuend_rows, subtrahend_rows])
+        return values, used_rows
+
+    def fact(self, row: int) -> Dict[str, Any]:
+        return {
+            "concept": self.vocab["concept"][self.columns["concept"][row]],
+            "company": self.vocab["company"][self.columns["company"][row]],
+            "year": int(self.columns["year"][row]),
+            "value": float(self.columns["value"][row]),
+            "unit": self.vocab["unit"][self.columns["unit"][row]],
+            "accession": self.vocab["accession"][self.columns["accession"][row]],
+            "filed": (_EPOCH + datetime.timedelta(days=int(self.columns["filed"][row]))).isoformat(),
+        }
+
+    def save(self, directory: str):
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        for name, column in self.columns.items():
+            np.save(path / f"facts_{name}.npy", column)
+        np.save(path / "facts_keys.npy", self._keys)
+        with open(path / "facts_vocab.json", "w", encoding="utf-8") as f:
+            json.dump(self.vocab, f)
+
+    @classmethod
+    def load(cls, directory: str) -> "FactsStore":
+        path = Path(directory)
+        store = cls()
+        with open(path / "facts_vocab.json", "r", encoding="utf-8") as f:
+            store.vocab = json.load(f)
+        store._code_of = {field: {value: code for code, value in enumerate(values)}
+                          for field, values in store.vocab.items()}
+        # Loaded columns are read-only maps; add_companyfacts concatenates into new arrays.
+        store.columns = {name: np.load(path / f"facts_{name}.npy", mmap_mode="r") for name in store.columns}
+        store._keys = np.load(path / "facts_keys.npy", mmap_mode="r")
+        return store
+
+
+@dataclass
+class FactsQuestion:
+    """A numeric question the facts store can answer: kind is one of FACT_KINDS"""
+    kind: str
+    metric: Metric
+    companies: List[str]
+    years: List[int]
+    descending: bool = True
+    superlative: str = "highest"
+
+
+def parse_question(query: str, default_companies: Sequence[str]) -> Optional[FactsQuestion]:
+    """Recognize ranking, growth, ratio, comparison and lookup questions; None for anything else"""
+    # A metric alias qualified into another line item ("deferred revenue") or adjusted ("revenue
+    # excluding acquisitions") is not the reported total, so such questions go to the text path.
+    if any(matcher.find(query) for matcher in (SEGMENT_MATCHER, QUALITATIVE_MATCHER, QUALIFIED_MATCHER,
+                                               ADJUSTMENT_MATCHER)):
+        return None
+    # Likewise any word the matchers below do not cover ("revenue in Europe", "revenue per share").
+    if unmatched_words(query, (COMPANY_MATCHER, METRIC_MATCHER, RANK_MATCHER, GROWTH_MATCHER, COMPARE_MATCHER,
+                               SHARE_MATCHER)):
+        return None
+    metric_spans = [(start, end) for start, end, _ in METRIC_MATCHER.matches(query)]
+
+    def outside_metrics(matcher: PhraseMatcher) -> List[Tuple[int, str]]:
+        # "top line" and "r&d as a percentage of revenue" hold a rank or share term of their own.
+        return [(start, value) for start, end, value in matcher.matches(query)
+                if not any(start < metric_end and metric_start < end for metric_start, metric_end in metric_spans)]
+
+    mentions = METRIC_MATCHER.find(query)
+    names = list(dict.fromkeys(name for _, name in mentions))
+    share = outside_metrics(SHARE_MATCHER)
+    if len(names) == 2 and share and mentions[0][0] < share[0][0] < mentions[-1][0]:
+        numerator, denominator = METRICS[names[0]], METRICS[names[1]]
+        metric = Metric(f"{numerator.name}_over_{denominator.name}",
+                        f"{numerator.label} as a percentage of {denominator.label}", (),
+                        ratio=(numerator.name, denominator.name))
+    elif len(names) == 1 and not share:
+        metric = METRICS[names[0]]
+    else:
+        return None
+
+    companies = find_companies(query)
+    years = sorted(int(year) for year in find_years(query))
+    rank = list(dict.fromkeys(value for _, value in outside_metrics(RANK_MATCHER)))
+    growth = bool(outside_metrics(GROWTH_MATCHER))
+    if growth:
+        if len(years) == 1:
+            years = [years[0] - 1, years[0]]
+        if len(years) != 2:
+            return None
+    elif not years:
+        return None
+
+    if rank:
+        kind = "rank"
+        if not growth and len(years) != 1:
+            return None
+    elif growth:
+        kind = "growth"
+    elif len(companies) > 1 or outside_metrics(COMPARE_MATCHER):
+        kind = "compare"
+    else:
+        kind = "lookup"
+    if not companies:
+        if kind not in ("rank", "compare"):
+            return None
+        companies = list(default_companies)
+    if kind == "rank" and len(companies) < 2:
+        return None
+    superlative = rank[0] if rank else "highest"
+    return FactsQuestion(kind, metric, companies, years, RANK_TERMS.get(superlative, True), superlative)
+
+
+def format_value(metric: Metric, value: float) -> str:
+    if metric.is_ratio:
+        return f"{value:.1%}"
+    if metric.unit == "USD/shares":
+        return f"${value:,.2f}"
+    if abs(value) >= 1e9:
+        return f"${value / 1e9:,.1f} billion"
+    if abs(value) >= 1e6:
+        return f"${value / 1e6:,.1f} million"
+    return f"${value:,.0f}"
+
+
+def _change(metric: Metric, before: float, after: float) -> Tuple[float, str]:
+    # Ratios change in percentage points; amounts by relative growth.
+    if metric.is_ratio:
+        delta = after - before
+        return delta, f"{delta * 100:+.1f} percentage points"
+    delta = after / before - 1 if before else np.nan
+    return delta, f"{delta:+.1%}"
+
+
+def answer_question(store: FactsStore, question: FactsQuestion) -> Optional[Dict[str, Any]]:
+    """Answer from the facts store, or None when any required fact is missing"""
+    metric, companies, years = question.metric, question.companies, question.years
+    values, rows = store.metric_values(metric, companies, years)
+    if np.isnan(values).any():
+        return None
+    names = [company_name(company) for company in companies]
+    label = metric.label
+
+    if question.kind == "lookup":
+        answer = " ".join(f"{names[0]}'s {label} for fiscal {year} was {format_value(metric, value)}."
+                          for year, value in zip(years, values[0]))
+    elif question.kind == "compare":
+        lines = []
+        for column, year in enumerate(years):
+            order = np.argsort(-values[:, column], kind="stable")
+            lines.append(f"{label[0].upper() + label[1:]} in fiscal {year}: " + ", ".join(
+                f"{names[i]} {format_value(metric, values[i, column])}" for i in order) + ".")
+        answer = " ".join(lines)
+    else:
+        changes = [_change(metric, before, after) for before, after in values] if len(years) == 2 else []
+        if question.kind == "growth":
+            answer = " ".join(
+                f"{name}'s {label} {'rose' if delta >= 0 else 'fell'} {text.lstrip('+-')} from fiscal {years[0]} "
+                f"({format_value(metric, before)}) to fiscal {years[1]} ({format_value(metric, after)})."
+                for name, (before, after), (delta, text) in zip(names, values, changes))
+        else:
+            growth = len(years) == 2
+            scores = np.array([delta for delta, _ in changes]) if growth else values[:, 0]
+            order = np.argsort(-scores if question.descending else scores, kind="stable")
+            shown = [changes[i][1] if growth else format_value(metric, values[i, 0]) for i in range(len(names))]
+            subject = f"{label} growth from fiscal {years[0]} to {years[1]}" if growth else f"{label} in fiscal {years[0]}"
+            answer = (f"{names[order[0]]} had the {question.superlative} {subject} ({shown[order[0]]}). Ranking: "
+                      + ", ".join(f"{rank}. {names[i]} {shown[i]}" for rank, i in enumerate(order, start=1)) + ".")
+
+    sources = []
+    for row in dict.fromkeys(rows.tolist()):
+        fact = store.fact(row)
+        sources.append({
+            "company": fact["company"],
+            "year": str(fact["year"]),
+            "excerpt": f"{TAXONOMY}:{fact['concept']} = {fact['value']:,.2f} {fact['unit']} "
+                       f"(accession {fact['accession']}, filed {fact['filed']})",
+            "chunk_id": f"xbrl:{fact['company']}:{fact['concept']}:{fact['year']}",
+            "relevance_score": 1.0,
+        })
+    return {
+        "answer": answer,
+        "reasoning": f"Answered from {len(sources)} XBRL company facts ({question.kind} of {label}) "
+                     f"without retrieval or LLM synthesis",
+        "sources": sources,
+    }
@@ -1,5 +1,4 @@
 import os
-import json
 from rag.system import FinancialRAGSystem
 
 
@@ -11,24 +10,20 @@ def main():
         return
 
     rag_system = FinancialRAGSystem(groq_api_key)
-    rag_system.setup_system()
+    try:
+        rag_system.setup_system()
 
-    print("\n" + "="*60)
-    print("RUNNING SAMPLE QUERIES")
-    print("="*60)
+        print("\n" + "="*60)
+        print("RUNNING SAMPLE QUERIES")
+        print("="*60)
 
-    results = rag_system.run_sample_queries()
+        # Results are appended to sample_results.jsonl as they complete; re-running resumes
+        rag_system.run_sample_queries(output_path='sample_results.jsonl')
 
-    with open('sample_results.json', 'w') as f:
-        json.dump([{
-            'query': r.query,
-            'answer': r.answer,
-            'reasoning': r.reasoning,
-            'sub_queries': r.sub_queries,
-            'sources': r.sources
-        } for r in results], f, indent=2)
-
-    print(f"\n✅ Results saved to sample_results.json")
+        print(f"\n✅ Results saved to sample_results.jsonl")
+    finally:
+        # Saves the query embedding cache for the next run
+        rag_system.close()
 
 
 if __name__ == "__main__":